@@ -12,7 +12,11 @@ CITIES = {
             "north": 55.75,
             "east": 12.68
         },
-        "default_zoom": 13
+        "default_zoom": 13,
+        # Local time zone (IANA name); event times are in city local time
+        "timezone": "Europe/Copenhagen",
+        # Where events come from; see services/event_sources.py for the types
+        "event_sources": [{"type": "simulated"}]
     },
     "ghent": {
         "name": "Ghent",
@@ -23,7 +27,8 @@ CITIES = {
             "north": 51.09,
             "east": 3.78
         },
-        "default_zoom": 14
+        "default_zoom": 14,
+        "timezone": "Europe/Brussels"
     }
 }
 
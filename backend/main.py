@@ -1,17 +1,47 @@
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, HTTPException, Path, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from backend.services.weather import get_weather
-from backend.services.places import get_cafes
-from backend.services.popular_times import get_popular_times
-from backend.services.business_score import calculate_business_score, find_nearest_cafe, calculate_cafe_density, get_density_label
+from backend.services.weather import get_weather, get_weather_at_hour, get_hourly_suitability
+from backend.services.places import get_cafes, get_cafe_index, get_cafe_snapshot, get_cafes_version, query_cafes, MAX_PAGE_SIZE, CLUSTER_MAX_ZOOM, CLUSTER_RADIUS_PX
+from backend.services.popular_times import get_popular_times_cached, shutdown_browser_pool, fetch_popular_times_many, estimate_busyness
+from backend.services.http import close_http_client
+from backend.services.prefetcher import busyness_prefetcher, PREFETCH_ENABLED
+from backend.services.traffic import city_now, get_traffic_model, resolve_time
+from backend.services.scoring import HotspotBatch, get_hotspot_batch, get_static_columns, compute_scores, compute_score_grid, hotspot_event_table, RECOMMENDATIONS, select_rows, lookup_permits, build_hotspot_results
+from backend.services.metrics import REQUEST_LATENCY, stage_timer, render_metrics
+from backend.services.response_cache import ResponseCache, response_cache, etag_matches
+from backend.services.serialization import FastJSONResponse
+from backend.services.spatial import SpatialIndex, cluster_points
+from backend.services.heatmap import get_grid_static, score_grid, quantize_scores, encode_raster, encode_png, find_peaks, SCORE_SCALE
+from backend.services.tiles import LayerBuilder, encode_tile, tile_bounds, MVT_MEDIA_TYPE, TILE_BUFFER, TILE_CACHE_MAX_ENTRIES
+from backend.services.compression import CompressionMiddleware, PrecompressedStaticFiles, choose_encoding, precompress_static, precompressed_file_response
 from backend.services.activity_zones import calculate_zone_scores
-from backend.services.permit_info import get_permit_status, PERMIT_REGULATIONS
-from backend.services.events import get_active_events
-from typing import Optional
+from backend.services.zone_discovery import get_discovered_zones
+from backend.services.permit_info import get_permit_status, get_permits_version, PERMIT_REGULATIONS
+from backend.services.event_index import EventIndex
+from backend.services.events import get_active_events, get_event_index, get_events_version
+from typing import Any, Callable, Dict, Hashable, List, Literal, Optional, Tuple
+import numpy as np
 from backend.config import CITIES, DEFAULT_CITY_ID
 from backend.hotspots import get_hotspots
+from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
 
-app = FastAPI(title="NomNom Lite API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keep live busyness snapshots warm in the background
+    if PREFETCH_ENABLED:
+        busyness_prefetcher.start()
+    # Compress the built SPA once instead of on every request
+    if os.path.exists(static_dir):
+        written = await run_in_threadpool(precompress_static, static_dir)
+        logger.info(f"Precompressed {written} static files")
+    yield
+    await busyness_prefetcher.stop()
+    # Stop pooled Chromium instances used for Popular Times scraping
+    await shutdown_browser_pool()
+    await close_http_client()
+
+app = FastAPI(title="NomNom Lite API", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Enable CORS for frontend
 app.add_middleware(
@@ -43,13 +73,20 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
             f"{request.method} {request.url.path} "
             f"{response.status_code} {process_time:.4f}s"
         )
+        
+        # Label by route template (e.g. /api/popular-times/{place_name}) to keep cardinality bounded
+        route = request.scope.get("route")
+        REQUEST_LATENCY.observe(
+            process_time, request.method, getattr(route, "path", "unmatched"), str(response.status_code)
+        )
         return response
 
+# Compress large responses (gzip, or brotli when available); added first so the logged time includes it
+app.add_middleware(CompressionMiddleware)
 app.add_middleware(RequestLoggingMiddleware)
 
 # Serve Static Files (Frontend)
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import PlainTextResponse
 import os
 
 # Mount static files if directory exists (it will after build)
@@ -58,72 +95,179 @@ import os
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 static_dir = os.path.join(BASE_DIR, "static")
 if os.path.exists(static_dir):
-    app.mount("/assets", StaticFiles(directory=f"{static_dir}/assets"), name="assets")
+    app.mount("/assets", PrecompressedStaticFiles(directory=f"{static_dir}/assets"), name="assets")
+
+# Cache-Control max-age (seconds) for read-mostly endpoints; clients revalidate with the ETag after
+STATIC_MAX_AGE = 60 * 60
+DATA_MAX_AGE = 5 * 60
+
+def cached_response(
+    request: Request,
+    version: Hashable,
+    render: Callable[[], Any],
+    max_age: int,
+    cache: ResponseCache = response_cache,
+    media_type: str = "application/json"
+) -> Response:
+    """
+    Serve a pre-serialized body from a response cache (JSON by default).
+    Keyed on route + query and re-rendered when `version` changes; answers
+    a matching If-None-Match with 304.
+    """
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+    entry = cache.get(key, version, render)
+    headers = {"ETag": entry["etag"], "Cache-Control": f"public, max-age={max_age}", "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), entry["etag"]):
+        return Response(status_code=304, headers=headers)
+    # Compressed variants are cached with the entry
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+    body = cache.encoded_body(entry, encoding, media_type)
+    if body is None:
+        return Response(entry["body"], media_type=media_type, headers=headers)
+    headers["Content-Encoding"] = encoding
+    headers["ETag"] = "W/" + entry["etag"]
+    return Response(body, media_type=media_type, headers=headers)
+
+def known_city(city_id: str) -> str:
+    """
+    city_id if it is configured, else DEFAULT_CITY_ID. Unknown ids already got
+    the default city's hotspots; mapping them up front also keeps them out of
+    the per-city caches, which would otherwise grow with every distinct id.
+    """
+    return city_id if city_id in CITIES else DEFAULT_CITY_ID
+
+def json_response(content: Any, response: Optional[Response] = None) -> FastJSONResponse:
+    """
+    Serialize a large payload straight to JSON bytes (skips jsonable_encoder),
+    keeping any headers already set on the endpoint's injected response.
+    """
+    result = FastJSONResponse(content)
+    if response is not None:
+        result.raw_headers.extend(response.headers.raw)
+    return result
 
 @app.get("/")
-async def read_root():
+async def read_root(request: Request):
     # Serve index.html if it exists (Production)
     if os.path.exists(f"{static_dir}/index.html"):
-        return FileResponse(f"{static_dir}/index.html")
+        return precompressed_file_response(f"{static_dir}/index.html", request.headers.get("accept-encoding", ""))
     return {"message": "NomNom Lite API", "status": "running"}
 
+@app.get("/api/metrics")
+def metrics():
+    """Prometheus metrics: route latency, pipeline stage timings, cache hit/miss counters"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/cities")
-def get_cities():
+def get_cities(request: Request):
     """Get list of supported cities"""
-    return CITIES
+    return cached_response(request, 0, lambda: CITIES, STATIC_MAX_AGE)
 
 @app.get("/api/weather")
-def weather(city_id: str = DEFAULT_CITY_ID):
-    """Get current weather data for a specific city"""
-    # TODO: Update weather service to accept city_id (currently hardcoded to Copenhagen)
-    # For now, we'll just return Copenhagen weather as a placeholder for Ghent if needed,
-    # or ideally update the weather service.
-    return get_weather()
+async def weather(city_id: str = DEFAULT_CITY_ID):
+    """Get current weather data for a specific city (cached)"""
+    return await get_weather(city_id)
 
 @app.get("/api/cafes")
-def cafes(city_id: str = DEFAULT_CITY_ID):
-    """Get cafe locations in a specific city"""
-    return get_cafes(city_id)
+async def cafes(
+    request: Request,
+    city_id: str = DEFAULT_CITY_ID,
+    south: Optional[float] = Query(None, ge=-90, le=90),
+    west: Optional[float] = Query(None, ge=-180, le=180),
+    north: Optional[float] = Query(None, ge=-90, le=90),
+    east: Optional[float] = Query(None, ge=-180, le=180),
+    zoom: Optional[int] = Query(None, ge=0, le=22),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
+    """
+    Get cafe locations in a specific city.
+    
+    Without viewport parameters the full list is returned (cached). With a
+    bbox (south/west/north/east), zoom and/or offset/limit, returns the
+    visible cafes - clustered when zoomed out - one page at a time.
+    """
+    bbox = (south, west, north, east)
+    if all(v is None for v in bbox) and zoom is None and "offset" not in request.query_params and "limit" not in request.query_params:
+        city_cafes = await get_cafes(city_id)
+        return cached_response(request, await get_cafes_version(city_id), lambda: city_cafes, DATA_MAX_AGE)
+    if any(v is None for v in bbox) and not all(v is None for v in bbox):
+        raise HTTPException(status_code=400, detail="bbox needs all of south, west, north and east")
+    return json_response(await query_cafes(city_id, None if south is None else bbox, zoom, offset, limit))
 
 @app.get("/api/hotspots")
 def hotspots(city_id: str = DEFAULT_CITY_ID):
     """Get all hotspots with default traffic levels for a city"""
+    city_id = known_city(city_id)
     city_hotspots = get_hotspots(city_id)
+    traffic_levels = estimate_traffic_levels(city_id, get_hotspot_batch(city_id, city_hotspots))
     result = []
-    for spot in city_hotspots:
+    for spot, traffic_level in zip(city_hotspots, traffic_levels.tolist()):
         spot_copy = spot.copy()
-        spot_copy["traffic_level"] = estimate_traffic(spot["name"], spot["type"])
+        spot_copy["traffic_level"] = traffic_level
         result.append(spot_copy)
     return result
 
 @app.get("/api/popular-times/{place_name}")
-def popular_times(place_name: str, city_id: str = DEFAULT_CITY_ID):
-    """Get Popular Times data for a specific place"""
+async def popular_times(place_name: str, city_id: str = DEFAULT_CITY_ID):
+    """Get Popular Times data for a specific place (cached)"""
     city_name = CITIES.get(city_id, {}).get("name", "Copenhagen")
-    return get_popular_times(place_name, city_name)
+    return await get_popular_times_cached(place_name, city_name)
 
-@app.get("/api/hotspots-live")
-def hotspots_live(city_id: str = DEFAULT_CITY_ID):
-    """Get hotspots with LIVE busyness data from Google Maps (slow)"""
-    city_hotspots = get_hotspots(city_id)
+async def get_live_busyness(city_id: str, city_hotspots: List[Dict], response: Response) -> List[Dict]:
+    """
+    Live busyness per spot.
+    Reads the prefetched city snapshot when there is one (places not swept yet
+    get an estimate), otherwise scrapes concurrently. Each result carries
+    'data_age' in seconds and the snapshot age goes in X-Snapshot-Age.
+    """
     city_name = CITIES.get(city_id, {}).get("name", "Copenhagen")
+    snapshot = busyness_prefetcher.get_snapshot(city_id)
+    now = time.time()
+    
+    if snapshot is None:
+        # Results may come from the (stale-while-revalidate) cache: age is since they were fetched
+        live_data = await fetch_popular_times_many([spot["name"] for spot in city_hotspots], city_name)
+        now = time.time()
+        return [dict(p, data_age=int(now - p.get("timestamp", now))) for p in live_data]
+    
+    response.headers["X-Snapshot-Age"] = str(int(now - snapshot["updated_at"]))
     result = []
     for spot in city_hotspots:
-        popular_data = get_popular_times(spot["name"], city_name)
+        popular_data = snapshot["places"].get(spot["name"])
+        if popular_data is None:
+            result.append({
+                "place_name": spot["name"],
+                "current_popularity": estimate_busyness(spot["name"], city_now(city_id)),
+                "data_available": False,
+                "data_age": None
+            })
+        else:
+            result.append(dict(popular_data, data_age=int(now - popular_data["fetched_at"])))
+    return result
+
+@app.get("/api/hotspots-live")
+async def hotspots_live(response: Response, city_id: str = DEFAULT_CITY_ID):
+    """Get hotspots with LIVE busyness data from Google Maps (prefetched snapshot)"""
+    city_hotspots = get_hotspots(city_id)
+    live_data = await get_live_busyness(city_id, city_hotspots, response)
+    result = []
+    for spot, popular_data in zip(city_hotspots, live_data):
         spot_copy = spot.copy()
         spot_copy["traffic_level"] = popular_data.get("current_popularity", 50)
         spot_copy["data_available"] = popular_data.get("data_available", False)
+        spot_copy["data_age"] = popular_data["data_age"]
         result.append(spot_copy)
-    return result
+    return json_response(result, response)
 
 @app.get("/api/events")
-def events(city_id: str = DEFAULT_CITY_ID):
-    """Get active events in a city (cached daily)"""
-    # TODO: Update event service to support multiple cities
-    return get_active_events()
+def events(request: Request, city_id: str = DEFAULT_CITY_ID):
+    """Get active events in a city (refreshed daily, served from memory)"""
+    return cached_response(request, get_events_version(city_id), lambda: get_active_events(city_id), DATA_MAX_AGE)
 
 @app.get("/api/hotspots-scored")
-def hotspots_scored(
+async def hotspots_scored(
+    response: Response,
     city_id: str = DEFAULT_CITY_ID,
     min_traffic: Optional[int] = Query(0, ge=0, le=100),
     max_competition_distance: Optional[int] = Query(1000, ge=0, le=5000),
@@ -134,188 +278,296 @@ def hotspots_scored(
     """
     Get hotspots with business scores and filtering options.
     """
-    # Get weather data
-    weather_data = get_weather() # TODO: Pass city_id
+    city_id = known_city(city_id)
+    timed = stage_timer("hotspots_scored")
+    
+    # Get weather data (hourly forecast when simulating another hour)
+    with timed("weather"):
+        if simulated_hour is not None:
+            weather_data = await get_weather_at_hour(city_id, simulated_hour)
+        else:
+            weather_data = await get_weather(city_id)
     weather_suitable = weather_data.get("is_suitable", True)
     
-    # Get cafe data for competition analysis
-    cafes_data = get_cafes(city_id)
+    # Get cafe index for competition analysis
+    with timed("cafes"):
+        cafe_index = await get_cafe_index(city_id)
     
     # Get active events
-    active_events = get_active_events() # TODO: Pass city_id
+    with timed("events"):
+        event_index = await run_in_threadpool(get_event_index, city_id)
     
     city_hotspots = get_hotspots(city_id)
-    city_name = CITIES.get(city_id, {}).get("name", "Copenhagen")
+    batch = get_hotspot_batch(city_id, city_hotspots)
     
-    result = []
-    for spot in city_hotspots:
-        # Get traffic level
+    # Filter by weather suitability
+    if require_suitable_weather and not weather_suitable:
+        return []
+    
+    # Get traffic level per spot
+    with timed("traffic"):
         if use_live_data:
-            popular_data = get_popular_times(spot["name"], city_name)
-            traffic_level = popular_data.get("current_popularity", 50)
-            data_available = popular_data.get("data_available", False)
+            popular_data = await get_live_busyness(city_id, city_hotspots, response)
+            traffic_levels = [p.get("current_popularity", 50) for p in popular_data]
+            data_available = [p.get("data_available", False) for p in popular_data]
         else:
-            traffic_level = estimate_traffic(spot["name"], spot["type"], simulated_hour)
-            data_available = False
-        
-        # Calculate Event Boost
-        nearby_events = []
-        event_boost = 0
-        
-        from math import radians, sin, cos, sqrt, atan2
-        
-        def calculate_distance(lat1, lon1, lat2, lon2):
-            R = 6371000 # Earth radius in meters
-            phi1, phi2 = radians(lat1), radians(lat2)
-            dphi = radians(lat2 - lat1)
-            dlambda = radians(lon2 - lon1)
-            a = sin(dphi/2)**2 + cos(phi1)*cos(phi2) * sin(dlambda/2)**2
-            c = 2 * atan2(sqrt(a), sqrt(1-a))
-            return R * c
-
-        for event in active_events:
-            # Simple distance check - assumes events are in the same city for now
-            # TODO: Filter events by city first
-            dist = calculate_distance(spot["lat"], spot["lon"], event["lat"], event["lon"])
-            if dist <= event["impact_radius"]:
-                nearby_events.append({
-                    "name": event["name"],
-                    "distance": int(dist),
-                    "boost": event["traffic_boost"]
-                })
-                event_boost = max(event_boost, event["traffic_boost"]) # Take max boost if multiple events
-        
-        # Apply boost to traffic level (cap at 100)
-        original_traffic = traffic_level
-        traffic_level = min(100, traffic_level + event_boost)
-        
-        # Filter by minimum traffic
-        if traffic_level < min_traffic:
-            continue
-        
-        # Calculate distance to nearest cafe (keep for info)
-        nearest_cafe_dist = find_nearest_cafe(spot["lat"], spot["lon"], cafes_data)
-        
-        # Calculate Cafe Density
-        cafe_density = calculate_cafe_density(spot["lat"], spot["lon"], cafes_data)
-        density_info = get_density_label(cafe_density)
-        
-        # Filter by weather suitability
-        if require_suitable_weather and not weather_suitable:
-            continue
-        
-        # Calculate business score using Density
-        score_data = calculate_business_score(traffic_level, cafe_density, weather_suitable)
-        
-        # Build result
-        spot_result = spot.copy()
-        spot_result["traffic_level"] = traffic_level
-        spot_result["nearest_cafe_distance"] = round(nearest_cafe_dist, 1)
-        spot_result["cafe_density"] = cafe_density
-        spot_result["density_label"] = density_info["label"]
-        spot_result["density_color"] = density_info["color"]
-        spot_result["weather_suitable"] = weather_suitable
-        spot_result["data_available"] = data_available
-        spot_result.update(score_data)
-        
-        # Add permit info
-        permit_info = get_permit_status(spot["name"], city_id)
-        spot_result["permit_status"] = permit_info["status"]
-        spot_result["permit_label"] = permit_info["label"]
-        spot_result["permit_color"] = permit_info["color"]
-        
-        # Add event info
-        spot_result["nearby_events"] = nearby_events
-        spot_result["event_boost"] = event_boost
-        spot_result["original_traffic"] = original_traffic
-        
-        result.append(spot_result)
+            traffic_levels = estimate_traffic_levels(city_id, batch, simulated_hour)
+            data_available = None
     
-    # Sort by business score (descending)
-    result.sort(key=lambda x: x["business_score"], reverse=True)
+    # Score all spots at once (event boost, cafe density, business score)
+    with timed("static_columns"):
+        static = get_static_columns(city_id, batch, cafe_index)
     
-    return result
+    with timed("scoring"):
+        _, hour = resolve_time(simulated_hour, city_id=city_id)
+        scores = compute_scores(batch, traffic_levels, static, weather_suitable, event_index, hour)
+    
+    # Filter by minimum traffic and sort by business score (descending)
+    with timed("sort"):
+        rows = select_rows(scores, min_traffic)
+    
+    with timed("permits"):
+        permits = lookup_permits(static, rows)
+    
+    with timed("build_results"):
+        results = build_hotspot_results(batch, scores, rows, permits, weather_suitable, event_index, data_available)
+    
+    with timed("serialize"):
+        return json_response(results, response)
 
-def estimate_traffic(name: str, spot_type: str, simulated_hour: Optional[int] = None) -> int:
-    """Estimate traffic level based on spot type and name"""
-    import datetime
-    
-    if simulated_hour is not None:
-        hour = simulated_hour
-        # Assume weekday for simulation unless we want to get fancy
-        day = 0 
-    else:
-        now = datetime.datetime.now()
-        hour = now.hour
-        day = now.weekday()
-    
-    # Base traffic by type
-    base_traffic = {
-        "tourist": 75,
-        "transport": 80,
-        "shopping": 70,
-        "park": 60,
-        "neighborhood": 50,
-        "cultural": 55
-    }
-    
-    base = base_traffic.get(spot_type, 50)
-    
-    # Time multiplier profiles
-    multiplier = 0.3 # Default low
-    
-    if spot_type == "park":
-        # Parks: High during day, very low at night
-        if 6 <= hour < 10: multiplier = 0.6
-        elif 10 <= hour < 18: multiplier = 1.1 # Peak
-        elif 18 <= hour < 21: multiplier = 0.5 # Sunset/Evening
-        else: multiplier = 0.1 # Night
-        
-    elif spot_type == "shopping":
-        # Shopping: High during business hours
-        if 9 <= hour < 11: multiplier = 0.7
-        elif 11 <= hour < 17: multiplier = 1.0
-        elif 17 <= hour < 19: multiplier = 0.8
-        else: multiplier = 0.2 # Closed
-        
-    elif spot_type == "transport":
-        # Transport: Rush hours
-        if 7 <= hour < 10: multiplier = 1.2 # Morning Rush
-        elif 10 <= hour < 15: multiplier = 0.8
-        elif 15 <= hour < 19: multiplier = 1.2 # Evening Rush
-        elif 19 <= hour < 23: multiplier = 0.6
-        else: multiplier = 0.3
-        
-    elif spot_type == "tourist":
-        # Tourist: Steady day, good evening
-        if 9 <= hour < 12: multiplier = 0.8
-        elif 12 <= hour < 18: multiplier = 1.1
-        elif 18 <= hour < 23: multiplier = 0.9 # Evening dining/walking
-        else: multiplier = 0.2
-        
-    elif spot_type == "neighborhood":
-        # Neighborhood: Morning coffee + Evening
-        if 7 <= hour < 10: multiplier = 1.0 # Morning coffee
-        elif 10 <= hour < 16: multiplier = 0.6 # Work hours
-        elif 16 <= hour < 20: multiplier = 0.9 # After work
-        else: multiplier = 0.4
-        
-    else:
-        # General fallback
-        if 8 <= hour < 18: multiplier = 0.9
-        elif 18 <= hour < 22: multiplier = 0.6
-        else: multiplier = 0.2
+@app.get("/api/hotspots-timeseries")
+async def hotspots_timeseries(
+    city_id: str = DEFAULT_CITY_ID,
+    all_days: Optional[bool] = Query(False)
+):
+    """
+    Scores for every hotspot for all 24 hours (and optionally all 7 days) in one response.
+    
+    Columnar layout: per-hotspot fields are arrays indexed by spot, and the
+    time-varying fields are nested arrays indexed [day][hour][spot]. Without
+    all_days a single weekday is returned, matching simulated_hour.
+    Weather uses today's hourly forecast and events today's boost timeline
+    (event_boost, [hour][spot]) for every day.
+    """
+    city_id = known_city(city_id)
+    weather_by_hour = await get_hourly_suitability(city_id)
+    cafe_index = await get_cafe_index(city_id)
+    event_index = await run_in_threadpool(get_event_index, city_id)
+    
+    city_hotspots = get_hotspots(city_id)
+    batch = get_hotspot_batch(city_id, city_hotspots)
+    static = get_static_columns(city_id, batch, cafe_index)
+    event_timeline = hotspot_event_table(batch, event_index)["timeline"]
+    
+    # (spots, 7, 24) -> (days, 24, spots)
+    model = get_traffic_model(city_id)
+    days = list(range(7)) if all_days else [0]
+    traffic = model.table[batch.type_codes(model)][:, days, :].transpose(1, 2, 0)
+    grid = compute_score_grid(traffic, static, event_timeline, weather_by_hour)
+    
+    return json_response({
+        "city_id": city_id,
+        "days": days,
+        "hours": list(range(24)),
+        "weather_suitable": weather_by_hour,
+        "recommendations": [{"label": label, "color": color} for label, color in RECOMMENDATIONS],
+        "hotspots": {
+            "name": [h["name"] for h in city_hotspots],
+            "lat": batch.lats.tolist(),
+            "lon": batch.lons.tolist(),
+            "type": batch.types,
+            "nearest_cafe_distance": np.round(static["nearest_cafe_distance"], 1).tolist(),
+            "cafe_density": static["cafe_density"].tolist(),
+            "permit_status": [p["status"] for p in static["permits"]]
+        },
+        "event_boost": event_timeline.T.tolist(),
+        "traffic_level": grid["traffic_level"].tolist(),
+        "business_score": np.round(grid["business_score"], 1).tolist(),
+        "recommendation": grid["recommendation_level"]
+    })
+
+# Rendered tiles; the version covers cafes, permits, events, weather and the current hour
+tile_cache = ResponseCache(name="tiles", max_entries=TILE_CACHE_MAX_ENTRIES, serialize=bytes)
+
+@app.get("/api/tiles/{z}/{x}/{y}")
+async def tiles(
+    request: Request,
+    z: int = Path(..., ge=0, le=22),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+    city_id: str = DEFAULT_CITY_ID
+):
+    """
+    Mapbox Vector Tile with "cafes" and "hotspots" point layers for a city.
+    
+    Hotspots carry their current traffic level, business score and
+    recommendation. Below zoom CLUSTER_MAX_ZOOM nearby cafes are merged into
+    single points with a "count" property, as in /api/cafes.
+    """
+    if x >= 1 << z or y >= 1 << z:
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    city_id = known_city(city_id)
+    
+    weather_suitable = (await get_weather(city_id)).get("is_suitable", True)
+    # Index, records and version from the same cafe table
+    cafe_index, cafe_records, cafes_version = await get_cafe_snapshot(city_id)
+    event_index = await run_in_threadpool(get_event_index, city_id)
+    events_version = await run_in_threadpool(get_events_version, city_id)
+    weekday, hour = resolve_time(city_id=city_id)
+    version = (cafes_version, get_permits_version(), events_version, weather_suitable, weekday, hour)
+    
+    def render():
+        return render_tile(city_id, z, x, y, hour, weather_suitable, event_index, cafe_index, cafe_records)
+    # Rendering is CPU-bound; keep it off the event loop
+    return await run_in_threadpool(
+        cached_response, request, version, render, DATA_MAX_AGE, cache=tile_cache, media_type=MVT_MEDIA_TYPE
+    )
+
+def render_tile(
+    city_id: str,
+    z: int,
+    x: int,
+    y: int,
+    hour: int,
+    weather_suitable: bool,
+    event_index: EventIndex,
+    cafe_index: SpatialIndex,
+    cafe_records: List[Dict]
+) -> bytes:
+    south, west, north, east = tile_bounds(z, x, y, TILE_BUFFER)
+    
+    cafes_layer = LayerBuilder("cafes", z, x, y)
+    rows = cafe_index.query_bbox(south, west, north, east)
+    if len(rows):
+        lats, lons = cafe_index.lats[rows], cafe_index.lons[rows]
+        if z < CLUSTER_MAX_ZOOM:
+            cluster_lats, cluster_lons, counts, labels = cluster_points(lats, lons, z, CLUSTER_RADIUS_PX)
+            merged = counts > 1
+            cafes_layer.add_points(cluster_lats[merged], cluster_lons[merged], [{"count": c} for c in counts[merged].tolist()])
+            single = counts[labels] == 1
+            rows, lats, lons = rows[single], lats[single], lons[single]
+        records = [cafe_records[i] for i in rows.tolist()]
+        cafes_layer.add_points(
+            lats, lons,
+            [{"name": r["name"], "amenity": r["amenity"], "count": 1} for r in records],
+            ids=[r["id"] for r in records]
+        )
+    
+    hotspots_layer = LayerBuilder("hotspots", z, x, y)
+    batch = get_hotspot_batch(city_id, get_hotspots(city_id))
+    inside = np.nonzero(
+        (batch.lats >= south) & (batch.lats <= north) & (batch.lons >= west) & (batch.lons <= east)
+    )[0]
+    if len(inside):
+        static = get_static_columns(city_id, batch, cafe_index)
+        scores = compute_scores(batch, estimate_traffic_levels(city_id, batch), static, weather_suitable, event_index, hour)
+        permits = lookup_permits(static, inside)
+        properties = []
+        for i, permit_info in zip(inside.tolist(), permits):
+            recommendation, color = RECOMMENDATIONS[scores["recommendation_level"][i]]
+            properties.append({
+                "name": batch.hotspots[i]["name"],
+                "type": batch.types[i],
+                "traffic_level": int(scores["traffic_level"][i]),
+                "business_score": round(float(scores["business_score"][i]), 1),
+                "recommendation": recommendation,
+                "color": color,
+                "permit_status": permit_info["status"]
+            })
+        hotspots_layer.add_points(batch.lats[inside], batch.lons[inside], properties, ids=inside.tolist())
     
-    # Weekend boost for tourist/park areas
-    if day >= 5 and spot_type in ["tourist", "park", "shopping"]:
-        multiplier *= 1.3
+    return encode_tile([cafes_layer, hotspots_layer])
+
+# PNG heatmaps are cached as raw bytes; JSON ones go through response_cache
+heatmap_png_cache = ResponseCache(name="heatmap_png", serialize=bytes)
+
+async def heatmap_inputs(city_id: str, hour: Optional[int]) -> Tuple[int, int, bool, EventIndex, SpatialIndex, Hashable]:
+    """(weekday, hour, weather_suitable, events, cafe index, data version) for a heatmap request."""
+    if city_id not in CITIES:
+        raise HTTPException(status_code=404, detail=f"Invalid city_id: {city_id}")
+    weekday, hour_of_day = resolve_time(hour, city_id=city_id)
+    weather_data = await get_weather_at_hour(city_id, hour) if hour is not None else await get_weather(city_id)
+    weather_suitable = weather_data.get("is_suitable", True)
+    cafe_index = await get_cafe_index(city_id)
+    event_index = await run_in_threadpool(get_event_index, city_id)
+    events_version = await run_in_threadpool(get_events_version, city_id)
+    version = (await get_cafes_version(city_id), events_version, weekday, hour_of_day, weather_suitable)
+    return weekday, hour_of_day, weather_suitable, event_index, cafe_index, version
+
+def compute_heatmap(city_id: str, weekday: int, hour: int, weather_suitable: bool, event_index: EventIndex, cafe_index: SpatialIndex):
+    """Score every grid cell of a city at the given time; returns (grid, per-cell columns)."""
+    batch = get_hotspot_batch(city_id, get_hotspots(city_id))
+    static = get_grid_static(city_id, batch, cafe_index)
+    model = get_traffic_model(city_id)
+    traffic = model.levels(batch.type_codes(model), weekday, hour)
+    return static["grid"], score_grid(static, traffic, weather_suitable, event_index, hour)
+
+@app.get("/api/heatmap")
+async def heatmap(
+    request: Request,
+    city_id: str = DEFAULT_CITY_ID,
+    hour: Optional[int] = Query(None, ge=0, le=23),
+    format: Literal["json", "png"] = Query("json")
+):
+    """
+    Business score for every ~50 m cell of the city bbox, now or at a given hour.
     
-    return min(100, int(base * multiplier))
+    Scores are quantized to uint8 (score * scale). JSON returns them
+    base64-encoded row-major (row 0 = north) with the grid geometry;
+    format=png returns the same raster as a grayscale image.
+    """
+    weekday, hour_of_day, weather_suitable, event_index, cafe_index, version = await heatmap_inputs(city_id, hour)
+    
+    def raster():
+        grid, scores = compute_heatmap(city_id, weekday, hour_of_day, weather_suitable, event_index, cafe_index)
+        return grid, quantize_scores(scores["business_score"], grid.shape)
+    
+    if format == "png":
+        return await run_in_threadpool(
+            cached_response, request, version, lambda: encode_png(raster()[1]), DATA_MAX_AGE,
+            cache=heatmap_png_cache, media_type="image/png"
+        )
+    
+    def render():
+        grid, values = raster()
+        return {
+            "city_id": city_id,
+            "weekday": weekday,
+            "hour": hour_of_day,
+            "weather_suitable": weather_suitable,
+            "grid": grid.describe(),
+            "scale": SCORE_SCALE,
+            "dtype": "uint8",
+            "scores": encode_raster(values)
+        }
+    return await run_in_threadpool(cached_response, request, version, render, DATA_MAX_AGE)
+
+@app.get("/api/heatmap/peaks")
+async def heatmap_peaks(
+    request: Request,
+    city_id: str = DEFAULT_CITY_ID,
+    hour: Optional[int] = Query(None, ge=0, le=23),
+    limit: int = Query(10, ge=1, le=100)
+):
+    """Top-N local maxima of the heatmap: candidate cart spots beyond the hotspot lists."""
+    weekday, hour_of_day, weather_suitable, event_index, cafe_index, version = await heatmap_inputs(city_id, hour)
+    
+    def render():
+        grid, scores = compute_heatmap(city_id, weekday, hour_of_day, weather_suitable, event_index, cafe_index)
+        return find_peaks(grid, scores, limit)
+    return await run_in_threadpool(cached_response, request, version, render, DATA_MAX_AGE)
+
+def estimate_traffic_levels(city_id: str, batch: HotspotBatch, simulated_hour: Optional[int] = None) -> np.ndarray:
+    """Estimate traffic for all spots of a city at once from the precompiled traffic table"""
+    model = get_traffic_model(city_id)
+    weekday, hour = resolve_time(simulated_hour, city_id=city_id)
+    return model.levels(batch.type_codes(model), weekday, hour)
 
 
 
 @app.get("/api/activity-zones")
-def activity_zones(
+async def activity_zones(
+    response: Response,
     city_id: str = DEFAULT_CITY_ID,
     min_traffic: Optional[int] = Query(0, ge=0, le=100),
     max_competition_distance: Optional[int] = Query(5000, ge=0, le=5000),
@@ -326,55 +578,59 @@ def activity_zones(
     Get aggregated activity zones showing overall business potential.
     Much faster than individual hotspot scoring.
     """
+    city_id = known_city(city_id)
+    timed = stage_timer("activity_zones")
+    
     # Get scored hotspots (reuse existing logic)
-    weather_data = get_weather() # TODO: Pass city_id
+    with timed("weather"):
+        weather_data = await get_weather(city_id)
     weather_suitable = weather_data.get("is_suitable", True)
-    cafes_data = get_cafes(city_id)
+    with timed("cafes"):
+        cafe_index = await get_cafe_index(city_id)
     
     if require_suitable_weather and not weather_suitable:
         return []
     
     city_hotspots = get_hotspots(city_id)
-    city_name = CITIES.get(city_id, {}).get("name", "Copenhagen")
+    batch = get_hotspot_batch(city_id, city_hotspots)
     
-    hotspots_scored = []
-    for spot in city_hotspots:
+    with timed("traffic"):
         if use_live_data:
-            popular_data = get_popular_times(spot["name"], city_name)
-            traffic_level = popular_data.get("current_popularity", 50)
+            live_data = await get_live_busyness(city_id, city_hotspots, response)
+            traffic_levels = [p.get("current_popularity", 50) for p in live_data]
         else:
-            traffic_level = estimate_traffic(spot["name"], spot["type"])
-        
-        if traffic_level < min_traffic:
-            continue
-        
-        nearest_cafe_dist = find_nearest_cafe(spot["lat"], spot["lon"], cafes_data)
-        cafe_density = calculate_cafe_density(spot["lat"], spot["lon"], cafes_data)
-        
-        score_data = calculate_business_score(traffic_level, cafe_density, weather_suitable)
-        
-        spot_result = spot.copy()
-        spot_result["traffic_level"] = traffic_level
-        spot_result["nearest_cafe_distance"] = round(nearest_cafe_dist, 1)
-        spot_result["cafe_density"] = cafe_density
-        spot_result["weather_suitable"] = weather_suitable
-        spot_result.update(score_data)
-        
-        hotspots_scored.append(spot_result)
+            traffic_levels = estimate_traffic_levels(city_id, batch)
     
-    # Calculate zone aggregates
-    zones = calculate_zone_scores(hotspots_scored)
+    with timed("static_columns"):
+        static = get_static_columns(city_id, batch, cafe_index)
     
-    return zones
+    with timed("scoring"):
+        scores = compute_scores(batch, traffic_levels, static, weather_suitable)
+        rows = select_rows(scores, min_traffic, sort=False)
+    
+    # Calculate zone aggregates over the zones discovered from hotspots and cafes
+    with timed("zones"):
+        cafes_version = await get_cafes_version(city_id)
+        discovered = await run_in_threadpool(get_discovered_zones, city_id, batch, cafe_index, cafes_version)
+        zones = calculate_zone_scores(city_id, batch, scores, rows, discovered)
+    
+    return json_response(zones, response)
 
 @app.get("/api/permit-info")
-def get_permit_info(city_id: str = DEFAULT_CITY_ID):
+def get_permit_info(request: Request, city_id: str = DEFAULT_CITY_ID):
     """Get permit regulations and information for a city"""
-    return PERMIT_REGULATIONS.get(city_id, PERMIT_REGULATIONS[DEFAULT_CITY_ID])
+    return cached_response(
+        request, 0, lambda: PERMIT_REGULATIONS.get(city_id, PERMIT_REGULATIONS[DEFAULT_CITY_ID]), STATIC_MAX_AGE
+    )
 
 @app.get("/api/hotspots-with-permits")
-def hotspots_with_permits(city_id: str = DEFAULT_CITY_ID):
+def hotspots_with_permits(request: Request, city_id: str = DEFAULT_CITY_ID):
     """Get all hotspots with permit status included"""
+    return cached_response(
+        request, get_permits_version(), lambda: build_hotspots_with_permits(city_id), DATA_MAX_AGE
+    )
+
+def build_hotspots_with_permits(city_id: str) -> List[Dict]:
     city_hotspots = get_hotspots(city_id)
     result = []
     for spot in city_hotspots:
@@ -387,20 +643,19 @@ def hotspots_with_permits(city_id: str = DEFAULT_CITY_ID):
     return result
 
 @app.get("/{full_path:path}")
-async def serve_frontend(full_path: str):
+async def serve_frontend(request: Request, full_path: str):
     """Serve the React frontend for any unmatched route"""
     # Allow API routes to pass through (handled by FastAPI priority)
     if full_path.startswith("api/"):
-        from fastapi import HTTPException
         raise HTTPException(status_code=404, detail="API endpoint not found")
     
     # Check if a specific file exists in static (e.g. favicon.ico, manifest.json)
     file_path = f"{static_dir}/{full_path}"
     if os.path.exists(file_path) and os.path.isfile(file_path):
-        return FileResponse(file_path)
+        return precompressed_file_response(file_path, request.headers.get("accept-encoding", ""))
         
     # Otherwise serve index.html for SPA routing
     if os.path.exists(f"{static_dir}/index.html"):
-        return FileResponse(f"{static_dir}/index.html")
+        return precompressed_file_response(f"{static_dir}/index.html", request.headers.get("accept-encoding", ""))
     
     return {"message": "Frontend not built. Run build.sh to generate static files."}
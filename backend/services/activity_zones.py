@@ -1,111 +1,210 @@
-from typing import Dict, List, Tuple
-
-# Define activity zones with geographic boundaries
-ACTIVITY_ZONES = [
-    {
-        "name": "City Center",
-        "center": [55.6761, 12.5683],
-        "radius": 1000,  # meters
-        "hotspots": ["Nyhavn", "Strøget", "Tivoli Gardens", "Kongens Nytorv", 
-                     "Christiansborg Palace", "The Round Tower", "Torvehallerne Market",
-                     "Magasin du Nord", "Copenhagen Central Station"]
-    },
-    {
-        "name": "Nørrebro District",
-        "center": [55.6897, 12.5531],
-        "radius": 800,
-        "hotspots": ["Nørrebro", "Nørreport Station", "Fælled Park"]
-    },
-    {
-        "name": "Vesterbro District",
-        "center": [55.6682, 12.5510],
-        "radius": 700,
-        "hotspots": ["Vesterbro", "Fisketorvet Shopping Center"]
-    },
-    {
-        "name": "Østerbro & Waterfront",
-        "center": [55.6950, 12.5870],
-        "radius": 900,
-        "hotspots": ["Østerbro", "The Little Mermaid", "Kastellet", "Østerport Station"]
-    },
-    {
-        "name": "Frederiksberg Area",
-        "center": [55.6775, 12.5320],
-        "radius": 750,
-        "hotspots": ["Frederiksberg", "Frederiksberg Centret", "Frederiksberg Gardens", 
-                     "Forum Station"]
-    },
-    {
-        "name": "Islands & Amager",
-        "center": [55.6691, 12.5857],
-        "radius": 850,
-        "hotspots": ["Christianshavn", "Islands Brygge", "Christianshavn Metro", 
-                     "IT University", "Amager Strandpark"]
-    },
-    {
-        "name": "Cultural Quarter",
-        "center": [55.6850, 12.5780],
-        "radius": 600,
-        "hotspots": ["University of Copenhagen", "Rosenborg Castle", "The King's Garden",
-                     "National Gallery", "Amalienborg Palace"]
-    }
-]
-
-def calculate_zone_scores(hotspots_with_scores: List[Dict]) -> List[Dict]:
+"""
+Activity zones: hotspot scores aggregated over named areas of a city.
+
+Zones normally come from zone_discovery (clustered from hotspots and
+cafes), where a hotspot belongs to the zone whose grid cells contain it.
+The predefined ACTIVITY_ZONES are circles (center, radius) used when
+nothing was discovered: each hotspot belongs to at most one of them, the
+nearest relative to its radius, as long as the hotspot is within
+ZONE_CATCHMENT radii of the centre. Membership is computed once per city,
+and aggregation is a single group-by over it.
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .scoring import RECOMMENDATIONS, HotspotBatch, recommendation_levels
+from .spatial import SpatialIndex
+from .zone_discovery import locate_zones
+
+# Hotspots up to this many radii from a zone's centre count toward it
+ZONE_CATCHMENT = 1.5
+
+# Predefined zone geometry per city (fallback for discovered zones)
+ACTIVITY_ZONES = {
+    "copenhagen": [
+        {
+            "name": "City Center",
+            "center": [55.6761, 12.5683],
+            "radius": 1000  # meters
+        },
+        {
+            "name": "Nørrebro District",
+            "center": [55.6897, 12.5531],
+            "radius": 800
+        },
+        {
+            "name": "Vesterbro District",
+            "center": [55.6682, 12.5510],
+            "radius": 700
+        },
+        {
+            "name": "Østerbro & Waterfront",
+            "center": [55.6950, 12.5870],
+            "radius": 900
+        },
+        {
+            "name": "Frederiksberg Area",
+            "center": [55.6775, 12.5320],
+            "radius": 750
+        },
+        {
+            "name": "Islands & Amager",
+            "center": [55.6691, 12.5857],
+            "radius": 850
+        },
+        {
+            "name": "Cultural Quarter",
+            "center": [55.6850, 12.5780],
+            "radius": 600
+        }
+    ],
+    "ghent": [
+        {
+            "name": "Historic Centre",
+            "center": [51.0545, 3.7225],
+            "radius": 450
+        },
+        {
+            "name": "Patershol & Gravensteen",
+            "center": [51.0580, 3.7225],
+            "radius": 250
+        },
+        {
+            "name": "Sint-Pieters & Citadelpark",
+            "center": [51.0380, 3.7180],
+            "radius": 650
+        },
+        {
+            "name": "University Quarter",
+            "center": [51.0450, 3.7290],
+            "radius": 450
+        },
+        {
+            "name": "Dampoort & Dok Noord",
+            "center": [51.0615, 3.7380],
+            "radius": 650
+        },
+        {
+            "name": "Ledeberg & Keizerpark",
+            "center": [51.0405, 3.7443],
+            "radius": 450
+        },
+        {
+            "name": "Blaarmeersen",
+            "center": [51.0461, 3.6853],
+            "radius": 700
+        }
+    ]
+}
+
+# Predefined zone sets per city, built once so their identity is stable
+_predefined_sets: Dict[str, Dict] = {}
+
+def get_zone_set(city_id: str, discovered: Optional[Dict] = None) -> Dict:
+    """Discovered zones when there are any, else the city's predefined ACTIVITY_ZONES."""
+    if discovered is not None and discovered["zones"]:
+        return discovered
+    if city_id not in _predefined_sets:
+        _predefined_sets[city_id] = {"zones": ACTIVITY_ZONES.get(city_id, [])}
+    return _predefined_sets[city_id]
+
+
+def assign_zones(lats: np.ndarray, lons: np.ndarray, zones: List[Dict]) -> np.ndarray:
+    """Zone position for every point, -1 for points outside every zone's catchment."""
+    zone_of = np.full(len(lats), -1, dtype=np.int64)
+    if not zones or len(lats) == 0:
+        return zone_of
+
+    centers = np.array([zone["center"] for zone in zones], dtype=np.float64)
+    reach = np.array([zone["radius"] for zone in zones], dtype=np.float64) * ZONE_CATCHMENT
+    index = SpatialIndex(centers[:, 0], centers[:, 1], cell_size=float(reach.max()))
+    points, zone_ids, dist = index.within_many(lats, lons, float(reach.max()))
+    relative = dist / reach[zone_ids]
+    inside = relative <= 1
+    points, zone_ids, relative = points[inside], zone_ids[inside], relative[inside]
+
+    # Nearest zone (relative to its size) per point; ties go to the first zone
+    order = np.lexsort((zone_ids, relative, points))
+    points, zone_ids = points[order], zone_ids[order]
+    first = np.ones(len(points), dtype=bool)
+    first[1:] = points[1:] != points[:-1]
+    zone_of[points[first]] = zone_ids[first]
+    return zone_of
+
+
+# Hotspot -> zone membership per city, keyed by city_id
+_memberships: Dict[str, Dict] = {}
+
+def get_zone_membership(city_id: str, batch: HotspotBatch, zone_set: Dict) -> np.ndarray:
+    """Zone position of each hotspot in the batch; rebuilt if the hotspots or zones change."""
+    cached = _memberships.get(city_id)
+    if cached is not None and cached["batch"] is batch and cached["zone_set"] is zone_set:
+        return cached["zone_of"]
+    if "labels" in zone_set:
+        zone_of = locate_zones(zone_set, batch.lats, batch.lons)
+    else:
+        zone_of = assign_zones(batch.lats, batch.lons, zone_set["zones"])
+    _memberships[city_id] = {"batch": batch, "zone_set": zone_set, "zone_of": zone_of}
+    return zone_of
+
+
+def calculate_zone_scores(
+    city_id: str,
+    batch: HotspotBatch,
+    scores: Dict[str, np.ndarray],
+    rows: np.ndarray,
+    discovered: Optional[Dict] = None
+) -> List[Dict]:
     """
     Aggregate hotspot scores into activity zones.
-    
+
     Args:
-        hotspots_with_scores: List of hotspots with business scores
-    
+        city_id: City whose zones to use
+        batch: The city's hotspots
+        scores: Score columns from compute_scores
+        rows: Hotspot rows to include (e.g. after the traffic filter)
+        discovered: Discovered zones (see zone_discovery.get_discovered_zones)
+
     Returns:
-        List of zones with aggregated scores
+        List of zones with aggregated scores, best first
     """
+    zone_set = get_zone_set(city_id, discovered)
+    zones = zone_set["zones"]
+    member = get_zone_membership(city_id, batch, zone_set)[rows]
+    rows, member = rows[member >= 0], member[member >= 0]
+
+    counts = np.bincount(member, minlength=len(zones))
+    def zone_mean(values: np.ndarray) -> np.ndarray:
+        return np.bincount(member, weights=values[rows], minlength=len(zones)) / np.maximum(counts, 1)
+
+    # Per-hotspot values are rounded as in the hotspot responses
+    avg_traffic = zone_mean(scores["traffic_level"].astype(np.float64))
+    avg_business_score = zone_mean(np.round(scores["business_score"], 1))
+    avg_competition = zone_mean(np.round(scores["nearest_cafe_distance"], 1))
+    levels = recommendation_levels(avg_business_score)
+
+    # Zones with hotspots, sorted by business score
+    present = np.nonzero(counts)[0]
+    present = present[np.argsort(-avg_business_score[present], kind="stable")]
+
     zones_result = []
-    
-    for zone in ACTIVITY_ZONES:
-        # Find hotspots in this zone
-        zone_hotspots = [
-            h for h in hotspots_with_scores 
-            if h["name"] in zone["hotspots"]
-        ]
-        
-        if not zone_hotspots:
-            continue
-        
-        # Calculate average scores
-        avg_traffic = sum(h["traffic_level"] for h in zone_hotspots) / len(zone_hotspots)
-        avg_business_score = sum(h["business_score"] for h in zone_hotspots) / len(zone_hotspots)
-        avg_competition = sum(h["nearest_cafe_distance"] for h in zone_hotspots) / len(zone_hotspots)
-        
-        # Determine zone color based on business score
-        if avg_business_score >= 80:
-            color = "#22c55e"  # Green
-            recommendation = "excellent"
-        elif avg_business_score >= 60:
-            color = "#eab308"  # Yellow
-            recommendation = "good"
-        elif avg_business_score >= 40:
-            color = "#f59e0b"  # Orange
-            recommendation = "moderate"
-        else:
-            color = "#ef4444"  # Red
-            recommendation = "poor"
-        
+    for z in present.tolist():
+        zone = zones[z]
+        recommendation, color = RECOMMENDATIONS[levels[z]]
         zones_result.append({
             "name": zone["name"],
             "center_lat": zone["center"][0],
             "center_lon": zone["center"][1],
             "radius": zone["radius"],
-            "avg_traffic": round(avg_traffic, 1),
-            "avg_business_score": round(avg_business_score, 1),
-            "avg_competition_distance": round(avg_competition, 1),
-            "hotspot_count": len(zone_hotspots),
+            "avg_traffic": round(float(avg_traffic[z]), 1),
+            "avg_business_score": round(float(avg_business_score[z]), 1),
+            "avg_competition_distance": round(float(avg_competition[z]), 1),
+            "hotspot_count": int(counts[z]),
             "color": color,
             "recommendation": recommendation
         })
-    
-    # Sort by business score
-    zones_result.sort(key=lambda x: x["avg_business_score"], reverse=True)
-    
+        if "polygon" in zone:
+            zones_result[-1]["polygon"] = zone["polygon"]
     return zones_result
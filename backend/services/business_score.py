@@ -1,5 +1,7 @@
 import math
-from typing import Dict, List
+from typing import Dict, List, Union
+
+from .spatial import SpatialIndex
 
 def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """
@@ -17,33 +19,27 @@ def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     
     return R * c
 
-def find_nearest_cafe(hotspot_lat: float, hotspot_lon: float, cafes: List[Dict]) -> float:
+def _as_index(cafes: Union[List[Dict], SpatialIndex]) -> SpatialIndex:
+    """Accept either a prebuilt cafe index or a raw cafe list."""
+    if isinstance(cafes, SpatialIndex):
+        return cafes
+    return SpatialIndex.from_records(cafes)
+
+def find_nearest_cafe(hotspot_lat: float, hotspot_lon: float, cafes: Union[List[Dict], SpatialIndex]) -> float:
     """
     Find distance to nearest cafe from a hotspot.
     Returns distance in meters.
+    Pass the city's prebuilt SpatialIndex (see places.get_cafe_index) to avoid a full scan.
     """
-    min_distance = float('inf')
-    
-    for cafe in cafes:
-        if cafe.get('error'):
-            continue
-        distance = calculate_distance(hotspot_lat, hotspot_lon, cafe['lat'], cafe['lon'])
-        min_distance = min(min_distance, distance)
+    min_distance = _as_index(cafes).nearest(hotspot_lat, hotspot_lon)
     
     return min_distance if min_distance != float('inf') else 500  # Default 500m if no cafes
 
-def calculate_cafe_density(hotspot_lat: float, hotspot_lon: float, cafes: List[Dict], radius_meters: int = 400) -> int:
+def calculate_cafe_density(hotspot_lat: float, hotspot_lon: float, cafes: Union[List[Dict], SpatialIndex], radius_meters: int = 400) -> int:
     """
     Calculate number of cafes within a specific radius.
     """
-    count = 0
-    for cafe in cafes:
-        if cafe.get('error'):
-            continue
-        distance = calculate_distance(hotspot_lat, hotspot_lon, cafe['lat'], cafe['lon'])
-        if distance <= radius_meters:
-            count += 1
-    return count
+    return _as_index(cafes).count_within(hotspot_lat, hotspot_lon, radius_meters)
 
 def get_density_label(count: int) -> Dict:
     """Return label and color for density count"""
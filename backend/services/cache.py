@@ -0,0 +1,157 @@
+"""
+In-memory caches shared by the services.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+from .metrics import record_cache
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent async loads of the same key into one call.
+
+    The first caller for a key starts the load; callers arriving while it is
+    in flight await the same task instead of hitting the upstream again.
+    """
+
+    def __init__(self, name: str):
+        self.name = name  # label for cache metrics
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        task = self._inflight.get(key)
+        # A task left behind by a closed event loop would never finish
+        return task is not None and task.get_loop() is asyncio.get_running_loop()
+
+    def start(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """The in-flight task for key, starting one if there is none."""
+        if self.in_flight(key):
+            record_cache(self.name, "coalesced")
+            return self._inflight[key]
+
+        async def run():
+            try:
+                return await loader()
+            finally:
+                if self._inflight.get(key) is task:
+                    del self._inflight[key]
+        task = asyncio.ensure_future(run())
+        self._inflight[key] = task
+        return task
+
+    async def do(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        # Shield so a caller's timeout doesn't cancel the shared load
+        return await asyncio.shield(self.start(key, loader))
+
+
+class ThreadSingleFlight:
+    """SingleFlight for blocking loads called from worker threads."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, Dict] = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._inflight
+
+    def do(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = {"done": threading.Event()}
+
+        if not leader:
+            record_cache(self.name, "coalesced")
+            call["done"].wait()
+            if "error" in call:
+                raise call["error"]
+            return call["value"]
+
+        try:
+            call["value"] = loader()
+            return call["value"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call["done"].set()
+
+
+class AsyncTTLCache:
+    """
+    Async LRU cache with a TTL and stale-while-revalidate.
+
+    - Fresh hit: returned straight from memory.
+    - Stale hit: the stale value is returned immediately and a background
+      refresh is started.
+    - Miss: the caller waits for the load.
+    Only one load per key is in flight at a time; concurrent callers for the
+    same key share it.
+    """
+
+    def __init__(self, name: str, ttl: float, max_size: int, ttl_for: Optional[Callable[[Any], float]] = None):
+        self.name = name  # label for cache metrics
+        self.ttl = ttl
+        self.max_size = max_size
+        self.ttl_for = ttl_for  # optional per-value TTL (e.g. shorter for failures)
+        self._entries: "OrderedDict[Hashable, Dict]" = OrderedDict()
+        self._flight = SingleFlight(name)
+        self._background: Set[asyncio.Task] = set()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def peek(self, key: Hashable) -> Optional[Dict]:
+        """Return the raw entry ({'value', 'stored_at', 'expires_at'}) without loading."""
+        return self._entries.get(key)
+
+    def set(self, key: Hashable, value: Any):
+        now = time.time()
+        ttl = self.ttl_for(value) if self.ttl_for else self.ttl
+        self._entries[key] = {"value": value, "stored_at": now, "expires_at": now + ttl}
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        async def load_and_store():
+            value = await loader()
+            self.set(key, value)
+            return value
+        return self._flight.start(key, load_and_store)
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            if time.time() < entry["expires_at"]:
+                record_cache(self.name, "hit")
+                return entry["value"]
+            record_cache(self.name, "stale")
+            if not self._flight.in_flight(key):
+                # Serve stale, refresh in the background
+                task = self._load(key, loader)
+                self._background.add(task)
+                task.add_done_callback(self._finish_background)
+            return entry["value"]
+
+        record_cache(self.name, "miss")
+        return await asyncio.shield(self._load(key, loader))
+
+    def _finish_background(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Background cache refresh failed: {task.exception()}")
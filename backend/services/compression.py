@@ -0,0 +1,179 @@
+"""
+Response compression (gzip / brotli).
+
+- CompressionMiddleware compresses buffered responses above a size threshold.
+- Static SPA assets are compressed once ahead of time (precompress_static)
+  and served as-is by PrecompressedStaticFiles / precompressed_file_response.
+Brotli is used when the `brotli` package is installed, otherwise gzip only.
+"""
+
+import gzip
+import mimetypes
+import os
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSION_MIN_SIZE = 1024  # bytes; smaller bodies aren't worth the CPU
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # on-the-fly; static assets use the maximum
+# Already-compressed formats (PNG, fonts, ...) are left alone; vector tiles are plain protobuf
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/javascript", "application/vnd.mapbox-vector-tile", "image/svg+xml", "text/"
+)
+STATIC_EXTENSIONS = (".html", ".js", ".mjs", ".css", ".json", ".svg", ".txt", ".map", ".webmanifest")
+
+# Content-Encoding token -> file suffix for precompressed assets
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def available_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Best encoding the client accepts (brotli first), or None."""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        token, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if token:
+            accepted[token] = quality
+    for encoding in available_encodings():
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str, static: bool = False) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if static else BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=9 if static else GZIP_LEVEL, mtime=0)
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing responses of at least `minimum_size` bytes.
+
+    Only single-message bodies (regular API responses, small files) are
+    compressed; streamed bodies and responses that already carry a
+    Content-Encoding are passed through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            compressible = is_compressible(headers.get("content-type", "")) and "content-encoding" not in headers
+            if compressible and "accept-encoding" not in headers.get("vary", "").lower():
+                headers.add_vary_header("Accept-Encoding")
+            if not compressible or encoding is None or message.get("more_body") or len(body) < self.minimum_size:
+                await send(start)
+                await send(message)
+                return
+
+            body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            # The compressed bytes differ from the identity representation
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = "W/" + etag
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def precompress_static(directory: str) -> int:
+    """
+    Write .br/.gz siblings for compressible static assets that are missing
+    or older than their source. Returns the number of files written; stops
+    (and serves uncompressed) if the directory can't be written to.
+    """
+    written = 0
+    for root, _, files in os.walk(directory):
+        for filename in files:
+            if not filename.endswith(STATIC_EXTENSIONS):
+                continue
+            path = os.path.join(root, filename)
+            if os.path.getsize(path) < COMPRESSION_MIN_SIZE:
+                continue
+            source_mtime = os.path.getmtime(path)
+            body = None
+            for encoding in available_encodings():
+                target = path + ENCODING_SUFFIXES[encoding]
+                if os.path.exists(target) and os.path.getmtime(target) >= source_mtime:
+                    continue
+                if body is None:
+                    with open(path, "rb") as f:
+                        body = f.read()
+                tmp_path = f"{target}.tmp-{os.getpid()}"
+                try:
+                    with open(tmp_path, "wb") as f:
+                        f.write(compress(body, encoding, static=True))
+                    os.replace(tmp_path, target)
+                except OSError as e:
+                    print(f"Static precompression error: {e}")
+                    return written
+                written += 1
+    return written
+
+
+def precompressed_file_response(path: str, accept_encoding: str, status_code: int = 200) -> FileResponse:
+    """FileResponse for `path`, using a precompressed sibling if the client accepts it."""
+    media_type = mimetypes.guess_type(path)[0] or "text/plain"
+    headers = {"Vary": "Accept-Encoding"} if os.path.exists(path + ENCODING_SUFFIXES["gzip"]) else {}
+    encoding = choose_encoding(accept_encoding)
+    if encoding is not None and os.path.exists(path + ENCODING_SUFFIXES[encoding]):
+        headers["Content-Encoding"] = encoding
+        path = path + ENCODING_SUFFIXES[encoding]
+    return FileResponse(path, status_code=status_code, media_type=media_type, headers=headers, stat_result=os.stat(path))
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves precompressed .br/.gz variants when accepted."""
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        response = precompressed_file_response(full_path, request_headers.get("accept-encoding", ""), status_code)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,197 @@
+"""
+Spatial index over events for the event-boost pass.
+
+Events are partitioned by city and active day, and within a partition
+bucketed into tiers by impact_radius. Each tier has its own grid index with
+cells as large as the tier's radius, so a point only checks the events whose
+influence circle can reach it and festival days with hundreds of small
+events stay cheap.
+
+Boosts are time-aware: an event has full impact from its start ("time") to
+its end ("end_time", else a typical duration for its type), builds up before
+the start and tails off after the end following its decay profile. Events
+without a start time apply all day.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..config import CITIES
+from .spatial import PROJECTION_PAD, SpatialIndex
+from .traffic import city_now
+
+# Upper impact_radius bound (meters) of each tier; larger events share a last tier
+EVENT_RADIUS_TIERS = (250, 500, 1000, 2000)
+
+# Hours of full impact for events without an end_time, by event type
+EVENT_DURATIONS = {
+    "concert": 3,
+    "cinema": 2.5,
+    "conference": 3,
+    "food": 6,
+    "market": 5,
+    "gathering": 1.5,
+    "tourist": 1,
+}
+DEFAULT_EVENT_DURATION = 2
+
+# Decay profiles: (hours of build-up before the start, hours of tail-off after the end)
+DECAY_PROFILES = {
+    "sharp": (0.5, 0.5),
+    "linear": (1, 2),
+    "long": (2, 4),
+}
+DEFAULT_DECAY_PROFILE = "linear"
+
+HOURS = np.arange(24)
+
+
+def _parse_hour(value: Optional[str]) -> Optional[float]:
+    """'HH:MM' as fractional hours, None if missing or malformed."""
+    try:
+        hours, minutes = str(value).split(":")[:2]
+        return int(hours) + int(minutes) / 60
+    except (TypeError, ValueError):
+        return None
+
+
+def hourly_weights(event: Dict) -> np.ndarray:
+    """
+    Share of an event's traffic_boost in effect during each hour (0-23) of its day,
+    taken at the middle of the hour. Windows past midnight are cut at the end of the day.
+    """
+    start = _parse_hour(event.get("time"))
+    if start is None:
+        return np.ones(24)
+    end = _parse_hour(event.get("end_time"))
+    if end is None:
+        end = start + EVENT_DURATIONS.get(event.get("type"), DEFAULT_EVENT_DURATION)
+    elif end <= start:
+        end += 24
+    lead, tail = DECAY_PROFILES.get(event.get("decay"), DECAY_PROFILES[DEFAULT_DECAY_PROFILE])
+
+    t = HOURS + 0.5
+    before = np.clip(1 - (start - t) / lead, 0, 1)
+    after = np.clip(1 - (t - end) / tail, 0, 1)
+    return np.where(t < start, before, np.where(t >= end, after, 1.0))
+
+
+class EventIndex:
+    """Events of one city and day, bucketed by impact radius."""
+
+    def __init__(self, events: List[Dict]):
+        self.events = events
+        self.lats = np.array([e["lat"] for e in events], dtype=np.float64)
+        self.lons = np.array([e["lon"] for e in events], dtype=np.float64)
+        self.radius = np.array([e["impact_radius"] for e in events], dtype=np.float64)
+        self.boost = np.array([e["traffic_boost"] for e in events], dtype=np.int64)
+        # (events, 24) boost of each event per hour, rounded like the traffic levels
+        self.hourly_boost = np.floor(
+            self.boost[:, None] * np.array([hourly_weights(e) for e in events]).reshape(len(events), 24) + 0.5
+        ).astype(np.int64)
+        # Per point-set boost tables, see point_table
+        self._tables: Dict[int, Tuple[object, Dict]] = {}
+
+        # (search radius, event positions, index over those events) per tier
+        self._tiers: List[Tuple[float, np.ndarray, SpatialIndex]] = []
+        tier_of = np.searchsorted(EVENT_RADIUS_TIERS, self.radius)
+        for tier in np.unique(tier_of).tolist():
+            members = np.nonzero(tier_of == tier)[0]
+            reach = EVENT_RADIUS_TIERS[tier] if tier < len(EVENT_RADIUS_TIERS) else float(self.radius[members].max())
+            # Cells just wider than the (padded) reach: queries scan a 3x3 block
+            index = SpatialIndex(self.lats[members], self.lons[members], cell_size=max(reach, 1.0) * PROJECTION_PAD)
+            self._tiers.append((reach, members, index))
+
+    def __len__(self):
+        return len(self.events)
+
+    def pairs(self, lats: Sequence[float], lons: Sequence[float]):
+        """
+        (point, event, distance) for every event whose impact circle contains
+        the point, sorted by point and then event position.
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        points, events, dists = [], [], []
+        for reach, members, index in self._tiers:
+            q, p, d = index.within_many(lats, lons, reach)
+            ev = members[p]
+            hit = d <= self.radius[ev]
+            points.append(q[hit])
+            events.append(ev[hit])
+            dists.append(d[hit])
+        if not points:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0, dtype=np.float64)
+
+        points, events, dists = np.concatenate(points), np.concatenate(events), np.concatenate(dists)
+        order = np.lexsort((events, points))
+        return points[order], events[order], dists[order]
+
+    def boosts(self, lats: Sequence[float], lons: Sequence[float], hour: Optional[int] = None) -> np.ndarray:
+        """
+        Max traffic boost reaching each point at `hour` (0 where no event is
+        in range); with hour=None each event counts with its full boost.
+        """
+        points, events, _ = self.pairs(lats, lons)
+        values = self.boost[events] if hour is None else self.hourly_boost[events, hour]
+        boosts = np.zeros(len(lats), dtype=np.int64)
+        np.maximum.at(boosts, points, values)
+        return boosts
+
+    def point_table(self, owner, lats: Sequence[float], lons: Sequence[float]) -> Dict:
+        """
+        Precomputed boosts for a fixed point set (e.g. a city's hotspots), kept
+        per owner object: the in-range pairs, each pair's boost per hour
+        ("pair_boost", pairs x 24) and the max per point and hour
+        ("timeline", points x 24). Hourly scoring is then a column lookup.
+        """
+        cached = self._tables.get(id(owner))
+        if cached is not None and cached[0] is owner:
+            return cached[1]
+
+        points, events, dists = self.pairs(lats, lons)
+        pair_boost = self.hourly_boost[events]
+        timeline = np.zeros((len(lats), 24), dtype=np.int64)
+        np.maximum.at(timeline, points, pair_boost)
+        table = {
+            "pairs": (points, events, dists),
+            "pair_starts": np.searchsorted(points, np.arange(len(lats) + 1)),
+            "pair_boost": pair_boost,
+            "timeline": timeline,
+        }
+        self._tables[id(owner)] = (owner, table)
+        return table
+
+
+EMPTY_EVENT_INDEX = EventIndex([])
+
+
+def event_city(event: Dict) -> Optional[str]:
+    """City an event belongs to: its city_id, else the city whose bbox contains it."""
+    if event.get("city_id"):
+        return event["city_id"]
+    for city_id, city in CITIES.items():
+        bbox = city["bbox"]
+        if bbox["south"] <= event["lat"] <= bbox["north"] and bbox["west"] <= event["lon"] <= bbox["east"]:
+            return city_id
+    return None
+
+
+def partition_events(events: List[Dict], today: Optional[str] = None) -> Dict[Tuple[str, str], EventIndex]:
+    """
+    Group events by (city_id, ISO date) and index each group.
+    Events without a date are taken to be today's (ISO date, default the
+    current date in the event's city); events outside every city are dropped.
+    """
+    groups: Dict[Tuple[str, str], List[Dict]] = {}
+    for event in events:
+        if event.get("error") or event.get("lat") is None or event.get("lon") is None:
+            continue
+        city_id = event_city(event)
+        if city_id is None:
+            continue
+        day = event.get("date") or today or city_now(city_id).date().isoformat()
+        groups.setdefault((city_id, day), []).append(event)
+    return {key: EventIndex(group) for key, group in groups.items()}
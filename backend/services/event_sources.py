@@ -0,0 +1,406 @@
+"""
+Pluggable event sources.
+
+A city's events come from the sources listed under "event_sources" in its
+CITIES entry, e.g. {"type": "ics", "path": "feeds/ghent.ics"}. Each source
+returns plain event dicts (id, name, lat, lon, impact_radius, traffic_boost,
+date, time, ...). Local JSON, CSV and ICS feeds are supported for testing;
+other types can be added with register_event_source.
+"""
+
+import csv
+import datetime
+from abc import ABC, abstractmethod
+import hashlib
+import json
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from ..config import CITIES
+from .traffic import city_now
+
+# Relative feed paths are resolved against the backend directory
+FEEDS_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_IMPACT_RADIUS = 300  # meters
+DEFAULT_TRAFFIC_BOOST = 15
+
+NUMERIC_FIELDS = {"lat": float, "lon": float, "impact_radius": float, "traffic_boost": int}
+
+
+def event_id(event: Dict) -> str:
+    """The event's id, or a stable one derived from its name, place and time."""
+    if event.get("id"):
+        return str(event["id"])
+    key = "|".join(str(event.get(k, "")) for k in ("name", "date", "time", "lat", "lon"))
+    return "evt_" + hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def normalize_event(raw: Dict[str, Any], city_id: str) -> Optional[Dict]:
+    """
+    Clean up a feed record: numeric fields converted, defaults filled in,
+    id and city_id set. None if it has no usable location or name.
+    """
+    event = {k: v for k, v in raw.items() if v not in (None, "")}
+    try:
+        for field, convert in NUMERIC_FIELDS.items():
+            if field in event:
+                event[field] = convert(event[field])
+    except (TypeError, ValueError):
+        return None
+    if "lat" not in event or "lon" not in event or not event.get("name"):
+        return None
+    event.setdefault("impact_radius", DEFAULT_IMPACT_RADIUS)
+    event.setdefault("traffic_boost", DEFAULT_TRAFFIC_BOOST)
+    event["id"] = event_id(event)
+    event["city_id"] = city_id
+    return event
+
+
+class EventSource(ABC):
+    """Base class: fetch(city_id) returns raw event dicts for one city."""
+
+    def __init__(self, **options):
+        self.options = options
+
+    @property
+    def name(self) -> str:
+        return self.options.get("name") or type(self).__name__
+
+    @abstractmethod
+    def fetch(self, city_id: str) -> List[Dict[str, Any]]:
+        """Raw event dicts for the city."""
+
+
+class FileEventSource(EventSource):
+    """A local feed file given by the "path" option."""
+
+    @property
+    def path(self) -> str:
+        return os.path.join(FEEDS_BASE_DIR, self.options["path"])
+
+    @property
+    def name(self) -> str:
+        return self.options.get("name") or self.options["path"]
+
+    def fetch(self, city_id: str) -> List[Dict[str, Any]]:
+        with open(self.path, "r", encoding="utf-8") as f:
+            return self.parse(f.read(), city_id)
+
+    @abstractmethod
+    def parse(self, text: str, city_id: str) -> List[Dict[str, Any]]:
+        """Raw event dicts from the feed's contents."""
+
+
+class JSONEventSource(FileEventSource):
+    """A JSON list of events, or an object with an "events" list."""
+
+    def parse(self, text: str, city_id: str) -> List[Dict[str, Any]]:
+        data = json.loads(text)
+        return data["events"] if isinstance(data, dict) else data
+
+
+class CSVEventSource(FileEventSource):
+    """CSV with a header row naming event fields (name, lat, lon, date, time, ...)."""
+
+    def parse(self, text: str, city_id: str) -> List[Dict[str, Any]]:
+        return [dict(row) for row in csv.DictReader(text.splitlines())]
+
+
+# ICS properties copied onto events as-is
+ICS_FIELDS = {
+    "UID": "id",
+    "SUMMARY": "name",
+    "DESCRIPTION": "description",
+    "URL": "url",
+    "CATEGORIES": "type",
+    "X-IMPACT-RADIUS": "impact_radius",
+    "X-TRAFFIC-BOOST": "traffic_boost",
+    "X-DECAY": "decay",
+}
+
+
+def _zone(name: Optional[str]) -> Optional[ZoneInfo]:
+    try:
+        return ZoneInfo(name) if name else None
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def _ics_datetime(value: str, tzid: Optional[str], local: Optional[ZoneInfo]):
+    """
+    ICS DATE or DATE-TIME value as (ISO date, 'HH:MM' or None) in the city's
+    local time. UTC ("...Z") and TZID times are converted; floating times are
+    taken as local already.
+    """
+    if "T" not in value:
+        return datetime.datetime.strptime(value[:8], "%Y%m%d").date().isoformat(), None
+    moment = datetime.datetime.strptime(value[:15], "%Y%m%dT%H%M%S")
+    source = datetime.timezone.utc if value.endswith("Z") else _zone(tzid)
+    if source is not None and local is not None:
+        moment = moment.replace(tzinfo=source).astimezone(local)
+    return moment.date().isoformat(), moment.strftime("%H:%M")
+
+
+def _ics_param(key: str, name: str) -> Optional[str]:
+    """Value of a property parameter, e.g. TZID from 'DTSTART;TZID=Europe/Brussels'."""
+    for param in key.split(";")[1:]:
+        param_name, _, param_value = param.partition("=")
+        if param_name.upper() == name:
+            return param_value.strip('"')
+    return None
+
+
+def _ics_unescape(value: str) -> str:
+    return re.sub(r"\\([\\;,nN])", lambda m: "\n" if m.group(1) in "nN" else m.group(1), value)
+
+
+class ICSEventSource(FileEventSource):
+    """
+    iCalendar VEVENTs. Location comes from GEO (lat;lon); impact radius,
+    traffic boost and decay profile can be given as X-IMPACT-RADIUS,
+    X-TRAFFIC-BOOST and X-DECAY. Times are converted to the city's timezone.
+    """
+
+    def parse(self, text: str, city_id: str) -> List[Dict[str, Any]]:
+        local = _zone(CITIES.get(city_id, {}).get("timezone"))
+        # Unfold continuation lines (RFC 5545 3.1)
+        lines = text.replace("\r\n", "\n").replace("\n ", "").replace("\n\t", "").split("\n")
+        events, current = [], None
+        for line in lines:
+            if line == "BEGIN:VEVENT":
+                current = {}
+            elif line == "END:VEVENT":
+                if current is not None:
+                    events.append(current)
+                current = None
+            elif current is not None and ":" in line:
+                key, value = line.split(":", 1)
+                prop = key.split(";", 1)[0].upper()
+                if prop in ICS_FIELDS:
+                    current[ICS_FIELDS[prop]] = _ics_unescape(value)
+                elif prop == "GEO" and ";" in value:
+                    current["lat"], current["lon"] = value.split(";", 1)
+                elif prop in ("DTSTART", "DTEND"):
+                    try:
+                        date, time = _ics_datetime(value, _ics_param(key, "TZID"), local)
+                    except ValueError:
+                        continue
+                    if prop == "DTSTART":
+                        current["date"] = date
+                        if time:
+                            current["time"] = time
+                    elif time:
+                        current["end_time"] = time
+        return events
+
+
+class SimulatedEventSource(EventSource):
+    """
+    Simulates a Google Search for 'Events in Copenhagen today'.
+    Returns a curated list of realistic events.
+    """
+
+    def fetch(self, city_id: str) -> List[Dict[str, Any]]:
+        # In a real app, this would use Google Search API or scraping
+        # For MVP, we return realistic data for Copenhagen
+        
+        today = city_now(city_id).date()
+        tomorrow = today + datetime.timedelta(days=1)
+        
+        # Expanded event list with "smaller" events and coffee opportunities
+        events = []
+        
+        # 1. Major Events (Always present for impact)
+        events.append({
+            "id": "evt_001",
+            "name": "Tivoli Gardens Summer Season",
+            "description": "Open air concerts and evening illumination",
+            "lat": 55.6737,
+            "lon": 12.5681,
+            "type": "concert",
+            "impact_radius": 800,
+            "traffic_boost": 30,
+            "date": today.isoformat(),
+            "time": "18:00",
+            "url": "https://www.google.com/search?q=Tivoli+Gardens+Summer+Season+Copenhagen"
+        })
+        
+        events.append({
+            "id": "evt_002",
+            "name": "Reffen Street Food Market",
+            "description": "Busy street food area with live DJ",
+            "lat": 55.6938,
+            "lon": 12.6082,
+            "type": "food",
+            "impact_radius": 500,
+            "traffic_boost": 25,
+            "date": today.isoformat(),
+            "time": "12:00",
+            "url": "https://www.google.com/search?q=Reffen+Street+Food+Market+Copenhagen"
+        })
+
+        # 2. "Smaller" Events & Coffee Opportunities
+        
+        # Morning Commuter/Yoga Spots (Good for coffee)
+        events.append({
+            "id": "evt_small_01",
+            "name": "Morning Yoga in King's Garden",
+            "description": "Community yoga gathering. Coffee needed after!",
+            "lat": 55.6856,
+            "lon": 12.5787,
+            "type": "gathering",
+            "impact_radius": 200,
+            "traffic_boost": 15,
+            "date": today.isoformat(),
+            "time": "08:00",
+            "url": "https://www.google.com/search?q=Morning+Yoga+King's+Garden+Copenhagen"
+        })
+        
+        events.append({
+            "id": "evt_small_02",
+            "name": "Langelinie Runners Meetup",
+            "description": "Large running group finishing their route.",
+            "lat": 55.6919,
+            "lon": 12.5975,
+            "type": "gathering",
+            "impact_radius": 150,
+            "traffic_boost": 20,
+            "date": today.isoformat(),
+            "time": "09:00",
+            "url": "https://www.google.com/search?q=Langelinie+Runners+Meetup+Copenhagen"
+        })
+
+        # Mid-day Business/Student Crowds
+        if today.weekday() < 5: # Weekdays only
+            events.append({
+                "id": "evt_small_03",
+                "name": "Tech Startup Open House",
+                "description": "Networking event in Nørrebro.",
+                "lat": 55.6897,
+                "lon": 12.5531,
+                "type": "conference",
+                "impact_radius": 100,
+                "traffic_boost": 15,
+                "date": today.isoformat(),
+                "time": "14:00",
+                "url": "https://www.google.com/search?q=Tech+Startup+Open+House+Norrebro+Copenhagen"
+            })
+            
+            events.append({
+                "id": "evt_small_04",
+                "name": "University Pop-up Lecture",
+                "description": "Outdoor student gathering.",
+                "lat": 55.6794,
+                "lon": 12.5726,
+                "type": "gathering",
+                "impact_radius": 150,
+                "traffic_boost": 10,
+                "date": today.isoformat(),
+                "time": "13:00",
+                "url": "https://www.google.com/search?q=University+Pop-up+Lecture+Copenhagen"
+            })
+
+        # Weekend Markets (High value)
+        if today.weekday() >= 5: # Weekend only
+            events.append({
+                "id": "evt_small_05",
+                "name": "Vesterbro Flea Market",
+                "description": "Local vintage market, high foot traffic.",
+                "lat": 55.6682,
+                "lon": 12.5510,
+                "type": "market",
+                "impact_radius": 300,
+                "traffic_boost": 25,
+                "date": today.isoformat(),
+                "time": "10:00",
+                "url": "https://www.google.com/search?q=Vesterbro+Flea+Market+Copenhagen"
+            })
+            
+            events.append({
+                "id": "evt_small_06",
+                "name": "Islands Brygge Harbor Fair",
+                "description": "Small stalls and music by the water.",
+                "lat": 55.6651,
+                "lon": 12.5771,
+                "type": "market",
+                "impact_radius": 250,
+                "traffic_boost": 20,
+                "date": today.isoformat(),
+                "time": "11:00",
+                "url": "https://www.google.com/search?q=Islands+Brygge+Harbor+Fair+Copenhagen"
+            })
+
+        # Evening/Afternoon Chill
+        events.append({
+            "id": "evt_small_07",
+            "name": "Outdoor Cinema: Zulu Sommerbio",
+            "description": "Free movie screening in the park.",
+            "lat": 55.6981,
+            "lon": 12.5631,
+            "type": "cinema",
+            "impact_radius": 400,
+            "traffic_boost": 35,
+            "date": today.isoformat(),
+            "time": "19:00",
+            "url": "https://www.google.com/search?q=Zulu+Sommerbio+Copenhagen"
+        })
+
+        events.append({
+            "id": "evt_small_08",
+            "name": "Canal Tour Grand Departure",
+            "description": "Large tourist group gathering.",
+            "lat": 55.6798,
+            "lon": 12.5914,
+            "type": "tourist",
+            "impact_radius": 100,
+            "traffic_boost": 25,
+            "date": today.isoformat(),
+            "time": "15:00",
+            "url": "https://www.google.com/search?q=Canal+Tour+Grand+Departure+Copenhagen"
+        })
+
+        # Add some future events
+        events.append({
+            "id": "evt_003",
+            "name": "Royal Arena Concert",
+            "description": "Large international music event",
+            "lat": 55.6253,
+            "lon": 12.5736,
+            "type": "concert",
+            "impact_radius": 1000,
+            "traffic_boost": 40,
+            "date": tomorrow.isoformat(),
+            "time": "20:00",
+            "url": "https://www.google.com/search?q=Royal+Arena+Concert+Copenhagen"
+        })
+        
+        return events
+
+
+EVENT_SOURCE_TYPES: Dict[str, Callable[..., EventSource]] = {
+    "simulated": SimulatedEventSource,
+    "json": JSONEventSource,
+    "csv": CSVEventSource,
+    "ics": ICSEventSource,
+}
+
+
+def register_event_source(type_name: str, factory: Callable[..., EventSource]):
+    """Make a source type available to "event_sources" entries in CITIES."""
+    EVENT_SOURCE_TYPES[type_name] = factory
+
+
+def get_city_sources(city_id: str) -> List[EventSource]:
+    """Event sources configured for a city (none if it lists no event_sources)."""
+    sources = []
+    for spec in CITIES.get(city_id, {}).get("event_sources", []):
+        options = dict(spec)
+        factory = EVENT_SOURCE_TYPES.get(options.pop("type", None))
+        if factory is None:
+            print(f"Unknown event source type for {city_id}: {spec}")
+            continue
+        sources.append(factory(**options))
+    return sources
@@ -1,235 +1,215 @@
 import json
 import os
 import datetime
-from typing import List, Dict, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+from ..config import CITIES
+from ..hotspots import get_hotspots
+from .cache import ThreadSingleFlight
+from .event_index import EMPTY_EVENT_INDEX, EventIndex, partition_events
+from .event_sources import get_city_sources, normalize_event
+from .scoring import get_hotspot_batch, hotspot_event_table
+from .traffic import city_now
+from .metrics import record_cache
 
-CACHE_FILE = "events_cache.json"
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache")
+CACHE_FILE_PREFIX = "events_"
 CACHE_DURATION_HOURS = 24
 
+def merge_events(previous: Optional[Dict], records: Iterable[Dict[str, Any]], city_id: str, remove_missing: bool = True) -> Dict:
+    """
+    Merge freshly fetched records into a city's event table by id.
+
+    Unchanged events keep their previous dict, and the table version (a
+    timestamp) only moves when an event was added, changed or removed.
+    With remove_missing=False (e.g. a source failed) nothing is dropped.
+    """
+    old = previous["by_id"] if previous else {}
+    events, by_id, changed = [], {}, 0
+    for record in records:
+        event = normalize_event(record, city_id)
+        if event is None or event["id"] in by_id:
+            continue
+        current = old.get(event["id"])
+        if current == event:
+            event = current
+        else:
+            changed += 1
+        events.append(event)
+        by_id[event["id"]] = event
+
+    removed = [event_id for event_id in old if event_id not in by_id]
+    if not remove_missing:
+        for event_id in removed:
+            events.append(old[event_id])
+            by_id[event_id] = old[event_id]
+        removed = []
+
+    if changed or removed:
+        print(f"Events for {city_id}: {changed} new or changed, {len(removed)} removed")
+    now = time.time()
+    unchanged = previous is not None and not changed and not removed
+    return {
+        "events": events,
+        "by_id": by_id,
+        "fetched_at": now,
+        "version": previous["version"] if unchanged else now
+    }
+
 class EventService:
-    def __init__(self):
-        self.cache_file = CACHE_FILE
+    """
+    Per-city event tables, served from memory.
 
-    def get_events(self) -> List[Dict[str, Any]]:
+    Each city's table is refreshed from its configured sources (see
+    event_sources) every CACHE_DURATION_HOURS and merged by event id. Tables
+    are persisted per city, written atomically by a background thread, and
+    read back on first use so a restart doesn't refetch.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.cache_dir = cache_dir
+        # {city_id: {"events": [...], "by_id": {id: event}, "fetched_at": ts, "version": ts}}
+        self._cities: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        # Requests run in worker threads; only one of them refreshes a city
+        self._refresh_flight = ThreadSingleFlight("events")
+        # A single writer keeps persisted snapshots in order
+        self._persist_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="events-persist")
+        # {city_id: ((version, built on date), {(city_id, date): EventIndex})}
+        self._indexes: Dict[str, Tuple[Tuple[float, str], Dict]] = {}
+
+    def get_events(self, city_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Events of a city (all cities if city_id is None), refreshed once a day."""
+        if city_id is None:
+            return [event for c in CITIES for event in self._get_table(c)["events"]]
+        if city_id not in CITIES:
+            return []
+        return self._get_table(city_id)["events"]
+
+    def get_version(self, city_id: Optional[str] = None):
+        """Version of a city's events (all cities if city_id is None); None for unknown cities."""
+        if city_id is None:
+            return tuple(self._get_table(c)["version"] for c in CITIES)
+        if city_id not in CITIES:
+            return None
+        return self._get_table(city_id)["version"]
+
+    def get_index(self, city_id: str, day: Optional[str] = None) -> EventIndex:
         """
-        Get events from cache or fetch fresh data if cache is stale.
-        Simulates a "once a day" Google Search.
+        Spatial index of a city's events for one day (ISO date, default today).
+        Built when the city's events change, together with its hotspot x hour
+        boost table, and again each day since undated events count as today's.
         """
-        if self._is_cache_valid():
-            return self._load_cache()
-        
-        events = self._fetch_events_from_source()
-        self._save_cache(events)
-        return events
-
-    def _is_cache_valid(self) -> bool:
-        """Check if cache file exists and is less than 24 hours old."""
-        if not os.path.exists(self.cache_file):
+        if city_id not in CITIES:
+            return EMPTY_EVENT_INDEX
+        table = self._get_table(city_id)
+        today = city_now(city_id).date().isoformat()
+        cached = self._indexes.get(city_id)
+        if cached is None or cached[0] != (table["version"], today):
+            cached = self._build_indexes(city_id, table)
+        return cached[1].get((city_id, day or today), EMPTY_EVENT_INDEX)
+
+    def _build_indexes(self, city_id: str, table: Dict) -> Tuple[Tuple[float, str], Dict]:
+        today = city_now(city_id).date().isoformat()
+        indexes = partition_events(table["events"], today)
+        batch = get_hotspot_batch(city_id, get_hotspots(city_id))
+        for index in indexes.values():
+            hotspot_event_table(batch, index)
+        cached = self._indexes[city_id] = ((table["version"], today), indexes)
+        return cached
+
+    def _get_table(self, city_id: str) -> Dict:
+        table = self._cities.get(city_id)
+        if table is None:
+            persisted = self._load_persisted(city_id)
+            if persisted is not None:
+                with self._lock:
+                    table = self._cities.setdefault(city_id, persisted)
+
+        if self._is_fresh(city_id, table):
+            record_cache("events", "hit")
+            return table
+
+        # Serve the previous table while another thread refreshes it
+        if table is not None and self._refresh_flight.in_flight(city_id):
+            record_cache("events", "stale")
+            return table
+
+        record_cache("events", "miss")
+        return self._refresh_flight.do(city_id, lambda: self._refresh(city_id))
+
+    def _is_fresh(self, city_id: str, table: Optional[Dict]) -> bool:
+        # Feeds list "today's" events (city local time), so a table from an earlier day is stale too
+        if table is None or time.time() - table["fetched_at"] >= CACHE_DURATION_HOURS * 3600:
             return False
-        
-        timestamp = os.path.getmtime(self.cache_file)
-        cache_time = datetime.datetime.fromtimestamp(timestamp)
-        age = datetime.datetime.now() - cache_time
-        
-        return age.total_seconds() < (CACHE_DURATION_HOURS * 3600)
-
-    def _load_cache(self) -> List[Dict[str, Any]]:
+        now = city_now(city_id)
+        return datetime.datetime.fromtimestamp(table["fetched_at"], now.tzinfo).date() == now.date()
+
+    def _refresh(self, city_id: str) -> Dict:
+        """Fetch every source of a city and merge the results into its table."""
+        previous = self._cities.get(city_id)
+        records, complete = [], True
+        for source in get_city_sources(city_id):
+            try:
+                records.extend(source.fetch(city_id))
+            except Exception as e:
+                print(f"Error fetching events from {source.name} for {city_id}: {e}")
+                complete = False
+
+        table = merge_events(previous, records, city_id, remove_missing=complete)
+        with self._lock:
+            self._cities[city_id] = table
+        if previous is None or table["version"] != previous["version"]:
+            self._build_indexes(city_id, table)
+        self._persist_executor.submit(self._save_table, city_id, table)
+        return table
+
+    def _cache_path(self, city_id: str) -> str:
+        return os.path.join(self.cache_dir, f"{CACHE_FILE_PREFIX}{city_id}.json")
+
+    def _load_persisted(self, city_id: str) -> Optional[Dict]:
+        path = self._cache_path(city_id)
+        if not os.path.exists(path):
+            return None
         try:
-            with open(self.cache_file, 'r') as f:
-                return json.load(f)
+            with open(path, 'r') as f:
+                data = json.load(f)
+            return {
+                "events": data["events"],
+                "by_id": {event["id"]: event for event in data["events"]},
+                "fetched_at": data["fetched_at"],
+                "version": data["version"]
+            }
         except Exception as e:
             print(f"Error loading cache: {e}")
-            return []
+            return None
 
-    def _save_cache(self, events: List[Dict[str, Any]]):
+    def _save_table(self, city_id: str, table: Dict):
+        # Write then rename, so readers (and other workers) never see a partial file
+        path = self._cache_path(city_id)
+        tmp_file = f"{path}.{os.getpid()}.tmp"
         try:
-            with open(self.cache_file, 'w') as f:
-                json.dump(events, f, indent=2)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_file, 'w') as f:
+                json.dump({
+                    "fetched_at": table["fetched_at"],
+                    "version": table["version"],
+                    "events": table["events"]
+                }, f, indent=2)
+            os.replace(tmp_file, path)
         except Exception as e:
             print(f"Error saving cache: {e}")
 
-    def _fetch_events_from_source(self) -> List[Dict[str, Any]]:
-        """
-        Simulates a Google Search for 'Events in Copenhagen today'.
-        Returns a curated list of realistic events.
-        """
-        # In a real app, this would use Google Search API or scraping
-        # For MVP, we return realistic data for Copenhagen
-        
-        today = datetime.date.today()
-        tomorrow = today + datetime.timedelta(days=1)
-        
-        # Expanded event list with "smaller" events and coffee opportunities
-        events = []
-        
-        # 1. Major Events (Always present for impact)
-        events.append({
-            "id": "evt_001",
-            "name": "Tivoli Gardens Summer Season",
-            "description": "Open air concerts and evening illumination",
-            "lat": 55.6737,
-            "lon": 12.5681,
-            "type": "concert",
-            "impact_radius": 800,
-            "traffic_boost": 30,
-            "date": today.isoformat(),
-            "time": "18:00",
-            "url": "https://www.google.com/search?q=Tivoli+Gardens+Summer+Season+Copenhagen"
-        })
-        
-        events.append({
-            "id": "evt_002",
-            "name": "Reffen Street Food Market",
-            "description": "Busy street food area with live DJ",
-            "lat": 55.6938,
-            "lon": 12.6082,
-            "type": "food",
-            "impact_radius": 500,
-            "traffic_boost": 25,
-            "date": today.isoformat(),
-            "time": "12:00",
-            "url": "https://www.google.com/search?q=Reffen+Street+Food+Market+Copenhagen"
-        })
-
-        # 2. "Smaller" Events & Coffee Opportunities
-        
-        # Morning Commuter/Yoga Spots (Good for coffee)
-        events.append({
-            "id": "evt_small_01",
-            "name": "Morning Yoga in King's Garden",
-            "description": "Community yoga gathering. Coffee needed after!",
-            "lat": 55.6856,
-            "lon": 12.5787,
-            "type": "gathering",
-            "impact_radius": 200,
-            "traffic_boost": 15,
-            "date": today.isoformat(),
-            "time": "08:00",
-            "url": "https://www.google.com/search?q=Morning+Yoga+King's+Garden+Copenhagen"
-        })
-        
-        events.append({
-            "id": "evt_small_02",
-            "name": "Langelinie Runners Meetup",
-            "description": "Large running group finishing their route.",
-            "lat": 55.6919,
-            "lon": 12.5975,
-            "type": "gathering",
-            "impact_radius": 150,
-            "traffic_boost": 20,
-            "date": today.isoformat(),
-            "time": "09:00",
-            "url": "https://www.google.com/search?q=Langelinie+Runners+Meetup+Copenhagen"
-        })
-
-        # Mid-day Business/Student Crowds
-        if today.weekday() < 5: # Weekdays only
-            events.append({
-                "id": "evt_small_03",
-                "name": "Tech Startup Open House",
-                "description": "Networking event in Nørrebro.",
-                "lat": 55.6897,
-                "lon": 12.5531,
-                "type": "conference",
-                "impact_radius": 100,
-                "traffic_boost": 15,
-                "date": today.isoformat(),
-                "time": "14:00",
-                "url": "https://www.google.com/search?q=Tech+Startup+Open+House+Norrebro+Copenhagen"
-            })
-            
-            events.append({
-                "id": "evt_small_04",
-                "name": "University Pop-up Lecture",
-                "description": "Outdoor student gathering.",
-                "lat": 55.6794,
-                "lon": 12.5726,
-                "type": "gathering",
-                "impact_radius": 150,
-                "traffic_boost": 10,
-                "date": today.isoformat(),
-                "time": "13:00",
-                "url": "https://www.google.com/search?q=University+Pop-up+Lecture+Copenhagen"
-            })
-
-        # Weekend Markets (High value)
-        if today.weekday() >= 5: # Weekend only
-            events.append({
-                "id": "evt_small_05",
-                "name": "Vesterbro Flea Market",
-                "description": "Local vintage market, high foot traffic.",
-                "lat": 55.6682,
-                "lon": 12.5510,
-                "type": "market",
-                "impact_radius": 300,
-                "traffic_boost": 25,
-                "date": today.isoformat(),
-                "time": "10:00",
-                "url": "https://www.google.com/search?q=Vesterbro+Flea+Market+Copenhagen"
-            })
-            
-            events.append({
-                "id": "evt_small_06",
-                "name": "Islands Brygge Harbor Fair",
-                "description": "Small stalls and music by the water.",
-                "lat": 55.6651,
-                "lon": 12.5771,
-                "type": "market",
-                "impact_radius": 250,
-                "traffic_boost": 20,
-                "date": today.isoformat(),
-                "time": "11:00",
-                "url": "https://www.google.com/search?q=Islands+Brygge+Harbor+Fair+Copenhagen"
-            })
-
-        # Evening/Afternoon Chill
-        events.append({
-            "id": "evt_small_07",
-            "name": "Outdoor Cinema: Zulu Sommerbio",
-            "description": "Free movie screening in the park.",
-            "lat": 55.6981,
-            "lon": 12.5631,
-            "type": "cinema",
-            "impact_radius": 400,
-            "traffic_boost": 35,
-            "date": today.isoformat(),
-            "time": "19:00",
-            "url": "https://www.google.com/search?q=Zulu+Sommerbio+Copenhagen"
-        })
-
-        events.append({
-            "id": "evt_small_08",
-            "name": "Canal Tour Grand Departure",
-            "description": "Large tourist group gathering.",
-            "lat": 55.6798,
-            "lon": 12.5914,
-            "type": "tourist",
-            "impact_radius": 100,
-            "traffic_boost": 25,
-            "date": today.isoformat(),
-            "time": "15:00",
-            "url": "https://www.google.com/search?q=Canal+Tour+Grand+Departure+Copenhagen"
-        })
-
-        # Add some future events
-        events.append({
-            "id": "evt_003",
-            "name": "Royal Arena Concert",
-            "description": "Large international music event",
-            "lat": 55.6253,
-            "lon": 12.5736,
-            "type": "concert",
-            "impact_radius": 1000,
-            "traffic_boost": 40,
-            "date": tomorrow.isoformat(),
-            "time": "20:00",
-            "url": "https://www.google.com/search?q=Royal+Arena+Concert+Copenhagen"
-        })
-        
-        return events
-
 # Singleton instance
 event_service = EventService()
 
-def get_active_events():
-    return event_service.get_events()
+def get_active_events(city_id: Optional[str] = None):
+    return event_service.get_events(city_id)
+
+def get_events_version(city_id: Optional[str] = None):
+    return event_service.get_version(city_id)
+
+def get_event_index(city_id: str, day: Optional[str] = None) -> EventIndex:
+    return event_service.get_index(city_id, day)
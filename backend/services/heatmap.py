@@ -0,0 +1,219 @@
+"""
+Opportunity heatmap: business scores on a regular grid over a city's bbox.
+
+Every grid cell is scored with the same components as the hotspots
+(traffic, cafe competition, event boost, weather). Cells have no spot type,
+so their traffic is taken from the surrounding hotspots: each hotspot's
+traffic curve, fading with distance (Gaussian, HEATMAP_TRAFFIC_FALLOFF),
+and the strongest contribution wins.
+"""
+
+import base64
+import math
+import struct
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ..config import CITIES
+from .event_index import EventIndex
+from .scoring import DENSITY_LABELS, DENSITY_RADIUS, RECOMMENDATIONS, HotspotBatch, density_levels, event_boosts, recommendation_levels
+from .spatial import EARTH_RADIUS, SpatialIndex
+
+HEATMAP_CELL_SIZE = 50  # meters
+HEATMAP_TRAFFIC_FALLOFF = 250  # meters (Gaussian sigma of a hotspot's traffic)
+PEAK_MIN_DISTANCE = 250  # meters between reported local maxima
+PEAK_MIN_SCORE = 40  # below this a cell is "poor" and never reported as a peak
+SCORE_SCALE = 2  # scores are multiples of 0.5, so score * 2 fits a uint8 exactly
+
+
+class CityGrid:
+    """Cell centres of a regular grid over a bbox; row 0 is the northern edge."""
+
+    def __init__(self, bbox: Dict, cell_size: float = HEATMAP_CELL_SIZE):
+        self.bbox = bbox
+        self.cell_size = cell_size
+        ref_lat = (bbox["south"] + bbox["north"]) / 2
+        self.lat_step = cell_size / (EARTH_RADIUS * math.pi / 180)
+        self.lon_step = cell_size / (EARTH_RADIUS * math.cos(math.radians(ref_lat)) * math.pi / 180)
+        self.rows = max(1, int(math.ceil((bbox["north"] - bbox["south"]) / self.lat_step)))
+        self.cols = max(1, int(math.ceil((bbox["east"] - bbox["west"]) / self.lon_step)))
+
+        row_lats = bbox["north"] - (np.arange(self.rows) + 0.5) * self.lat_step
+        col_lons = bbox["west"] + (np.arange(self.cols) + 0.5) * self.lon_step
+        grid_lats, grid_lons = np.meshgrid(row_lats, col_lons, indexing="ij")
+        self.lats = grid_lats.ravel()
+        self.lons = grid_lons.ravel()
+
+    @property
+    def shape(self):
+        return self.rows, self.cols
+
+    def locate(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """Flat cell index containing each point, -1 for points outside the grid."""
+        row = np.floor((self.bbox["north"] - np.asarray(lats)) / self.lat_step).astype(np.int64)
+        col = np.floor((np.asarray(lons) - self.bbox["west"]) / self.lon_step).astype(np.int64)
+        inside = (row >= 0) & (row < self.rows) & (col >= 0) & (col < self.cols)
+        return np.where(inside, row * self.cols + col, -1)
+
+    def describe(self) -> Dict:
+        """Grid geometry for clients: cell (r, c) is centred at north - (r+0.5)*lat_step, west + (c+0.5)*lon_step."""
+        return {
+            "rows": self.rows,
+            "cols": self.cols,
+            "cell_size": self.cell_size,
+            "lat_step": self.lat_step,
+            "lon_step": self.lon_step,
+            **self.bbox
+        }
+
+
+_grids: Dict[str, CityGrid] = {}
+
+def get_city_grid(city_id: str) -> CityGrid:
+    grid = _grids.get(city_id)
+    if grid is None:
+        grid = _grids[city_id] = CityGrid(CITIES[city_id]["bbox"])
+    return grid
+
+
+def _traffic_weights(grid: CityGrid, batch: HotspotBatch) -> np.ndarray:
+    """(cells, hotspots) distance falloff of each hotspot's traffic, float32."""
+    # Local equirectangular offsets are accurate to well under 1% within a city
+    x_scale = EARTH_RADIUS * math.cos(math.radians(grid.lats.mean())) * math.pi / 180
+    y_scale = EARTH_RADIUS * math.pi / 180
+    dx = ((grid.lons[:, None] - batch.lons[None, :]) * x_scale).astype(np.float32)
+    dy = ((grid.lats[:, None] - batch.lats[None, :]) * y_scale).astype(np.float32)
+    return np.exp(-(dx * dx + dy * dy) / np.float32(2 * HEATMAP_TRAFFIC_FALLOFF ** 2))
+
+
+# Per-city grid columns that only change with hotspots or cafes
+_grid_static: Dict[str, Dict] = {}
+
+def get_grid_static(city_id: str, batch: HotspotBatch, cafe_index: SpatialIndex) -> Dict:
+    """
+    Traffic weights and cafe competition for every grid cell.
+    Rebuilt when the hotspot list or the cafe index changes.
+    """
+    static = _grid_static.get(city_id)
+    if static is not None and static["batch"] is batch and static["cafe_index"] is cafe_index:
+        return static
+
+    grid = get_city_grid(city_id)
+    cafe_density = cafe_index.count_within_many(grid.lats, grid.lons, DENSITY_RADIUS)
+    density_level = density_levels(cafe_density)
+    static = {
+        "batch": batch,
+        "cafe_index": cafe_index,
+        "grid": grid,
+        "traffic_weights": _traffic_weights(grid, batch),
+        "cafe_density": cafe_density,
+        "competition_score": np.array([d["score_boost"] for d in DENSITY_LABELS])[density_level] * 1.5,
+    }
+    _grid_static[city_id] = static
+    return static
+
+
+def score_grid(static: Dict, hotspot_traffic: np.ndarray, weather_suitable: bool, events: Optional[EventIndex] = None, hour: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """
+    Score every grid cell for one point in time.
+
+    hotspot_traffic is the per-hotspot traffic level at that hour (before
+    event boosts); events add their boost at that hour to cells in range,
+    as for hotspots. Returns flat per-cell columns (reshape with grid.shape).
+    """
+    grid = static["grid"]
+    if len(hotspot_traffic):
+        traffic = (static["traffic_weights"] * np.asarray(hotspot_traffic, dtype=np.float32)[None, :]).max(axis=1)
+    else:
+        traffic = np.zeros(len(grid.lats), dtype=np.float32)
+    boosts = event_boosts(grid.lats, grid.lons, events, hour)
+    traffic_level = np.minimum(100, np.round(traffic) + boosts)
+
+    weather_score = 100 * 0.2 if weather_suitable else 0
+    business_score = traffic_level * 0.5 + static["competition_score"] + weather_score
+    return {
+        "traffic_level": traffic_level,
+        "cafe_density": static["cafe_density"],
+        "business_score": business_score,
+    }
+
+
+def quantize_scores(business_score: np.ndarray, shape) -> np.ndarray:
+    """Scores as a (rows, cols) uint8 raster holding score * SCORE_SCALE."""
+    return np.clip(np.round(business_score * SCORE_SCALE), 0, 255).astype(np.uint8).reshape(shape)
+
+
+def encode_raster(raster: np.ndarray) -> str:
+    return base64.b64encode(raster.tobytes()).decode("ascii")
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def encode_png(raster: np.ndarray) -> bytes:
+    """8-bit grayscale PNG of a uint8 raster (no imaging library needed)."""
+    rows, cols = raster.shape
+    # Each scanline is prefixed with filter type 0 (none)
+    scanlines = np.hstack([np.zeros((rows, 1), dtype=np.uint8), raster]).tobytes()
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", cols, rows, 8, 0, 0, 0, 0))
+        + _png_chunk(b"IDAT", zlib.compress(scanlines, 6))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def _window_max(values: np.ndarray, radius: int) -> np.ndarray:
+    """Maximum over a (2r+1) x (2r+1) window, computed separably."""
+    padded = np.pad(values, radius, mode="constant", constant_values=-np.inf)
+    rows, cols = values.shape
+    by_row = np.max([padded[:, i:i + cols] for i in range(2 * radius + 1)], axis=0)
+    return np.max([by_row[i:i + rows, :] for i in range(2 * radius + 1)], axis=0)
+
+
+def local_peaks(values: np.ndarray, radius: int, min_value: float, limit: Optional[int] = None) -> List[int]:
+    """
+    Flat cells of the local maxima of a 2D grid that reach min_value,
+    strongest first, no two within `radius` cells of each other.
+    """
+    is_peak = (values >= _window_max(values, radius)) & (values >= min_value)
+    candidates = np.nonzero(is_peak.ravel())[0]
+    candidates = candidates[np.argsort(-values.ravel()[candidates], kind="stable")]
+
+    # Plateaus yield several equal maxima; keep the first of each cluster
+    cols = values.shape[1]
+    peaks = []
+    for cell in candidates.tolist():
+        row, col = divmod(cell, cols)
+        if any(abs(row - r) <= radius and abs(col - c) <= radius for r, c, _ in peaks):
+            continue
+        peaks.append((row, col, cell))
+        if limit is not None and len(peaks) >= limit:
+            break
+    return [cell for _, _, cell in peaks]
+
+
+def find_peaks(grid: CityGrid, scores: Dict[str, np.ndarray], limit: int = 10) -> List[Dict]:
+    """
+    Top-N local maxima of the business score, at least PEAK_MIN_DISTANCE apart.
+    """
+    business = scores["business_score"].reshape(grid.shape)
+    radius = max(1, int(round(PEAK_MIN_DISTANCE / grid.cell_size)))
+    peaks = local_peaks(business, radius, PEAK_MIN_SCORE, limit)
+
+    levels = recommendation_levels(scores["business_score"][peaks])
+    return [
+        {
+            "lat": round(float(grid.lats[cell]), 6),
+            "lon": round(float(grid.lons[cell]), 6),
+            "business_score": round(float(scores["business_score"][cell]), 1),
+            "traffic_level": int(scores["traffic_level"][cell]),
+            "cafe_density": int(scores["cafe_density"][cell]),
+            "recommendation": RECOMMENDATIONS[level][0],
+            "color": RECOMMENDATIONS[level][1]
+        }
+        for cell, level in zip(peaks, levels.tolist())
+    ]
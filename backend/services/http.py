@@ -0,0 +1,32 @@
+"""
+Shared async HTTP client for upstream APIs (Open-Meteo, Overpass).
+
+One connection pool per event loop; closed from the app lifespan.
+"""
+
+import asyncio
+from typing import Optional
+
+import httpx
+
+HTTP_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16)
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """The shared client, created on first use in the running event loop."""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    # Pooled connections belong to the loop that opened them
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS)
+        _client_loop = loop
+    return _client
+
+async def close_http_client():
+    global _client, _client_loop
+    client, _client, _client_loop = _client, None, None
+    if client is not None:
+        await client.aclose()
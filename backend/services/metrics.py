@@ -0,0 +1,126 @@
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Counters and histograms are kept per process (one set per uvicorn worker)
+and rendered by /api/metrics.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+# Seconds; covers sub-millisecond cache hits up to slow upstream scrapes
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # labels -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, series):
+                    le = 'le="%s"' % bound
+                    lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {count}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {series[-2]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {series[-1]}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "nomnom_request_duration_seconds",
+    "HTTP request latency by route",
+    ("method", "route", "status")
+)
+STAGE_LATENCY = Histogram(
+    "nomnom_stage_duration_seconds",
+    "Time spent in each scoring pipeline stage",
+    ("endpoint", "stage")
+)
+CACHE_REQUESTS = Counter(
+    "nomnom_cache_requests_total",
+    "Cache lookups by cache and result (hit, stale, miss)",
+    ("cache", "result")
+)
+
+REGISTRY = [REQUEST_LATENCY, STAGE_LATENCY, CACHE_REQUESTS]
+
+
+def record_cache(cache: str, result: str):
+    """Count a cache lookup; result is 'hit', 'stale' or 'miss'."""
+    CACHE_REQUESTS.inc(cache, result)
+
+
+def stage_timer(endpoint: str):
+    """Return a `with timer("stage"):` helper bound to an endpoint name."""
+    return lambda stage: STAGE_LATENCY.time(endpoint, stage)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -2,6 +2,8 @@
 Copenhagen Mobile Vending Permit Information
 """
 
+import hashlib
+
 from ..config import DEFAULT_CITY_ID
 
 # Permit status classification
@@ -93,6 +95,15 @@ LOCATION_PERMITS = {
     }
 }
 
+def get_permits_version() -> str:
+    """
+    Digest of LOCATION_PERMITS' contents. Precomputed permit columns (see
+    scoring.get_static_columns) and cached responses rebuild when it changes,
+    however the table was edited. The table is small, so this is cheap.
+    """
+    entries = sorted((city_id, sorted(permits.items())) for city_id, permits in LOCATION_PERMITS.items())
+    return hashlib.blake2b(repr(entries).encode("utf-8"), digest_size=8).hexdigest()
+
 def get_permit_status(location_name: str, city_id: str = DEFAULT_CITY_ID) -> dict:
     """Get permit status for a location in a specific city."""
     city_permits = LOCATION_PERMITS.get(city_id, {})
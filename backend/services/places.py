@@ -1,39 +1,326 @@
-import requests
-from typing import List, Dict
+import asyncio
+from typing import List, Dict, Optional, Tuple
 import json
 import os
 import time
+import numpy as np
 from ..config import CITIES, DEFAULT_CITY_ID
+from .cache import SingleFlight
+from .http import get_http_client
+from .spatial import SpatialIndex, cluster_points
+from .metrics import record_cache
 
-CACHE_FILE_PREFIX = "cafes_cache_"
+# Cafe store: per city a memory-mappable .npy of coordinates/ids plus a JSON
+# side table (names, amenities, timestamp). The JSON is written last and names
+# the .npy generation it belongs to, so readers never see a half-written store.
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache")
+CACHE_FILE_PREFIX = "cafes_"
 CACHE_DURATION = 24 * 60 * 60  # 24 hours
+LEGACY_CACHE_FILE_PREFIX = "cafes_cache_"  # old CWD-relative JSON cache
+OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+OVERPASS_TIMEOUT = 60  # seconds; the query itself allows the server 25
 
-def get_cafes(city_id: str = DEFAULT_CITY_ID) -> List[Dict]:
+# Old .npy generations are only deleted once nobody has written them for this long
+STORE_GC_GRACE = 5 * 60  # seconds
+
+COORD_DTYPE = np.dtype([("lat", "f8"), ("lon", "f8"), ("id", "i8")])
+
+# Viewport queries: below CLUSTER_MAX_ZOOM cafes are grouped into screen-space
+# clusters of CLUSTER_RADIUS_PX; raw cafes are paged at most MAX_PAGE_SIZE at a time
+CLUSTER_MAX_ZOOM = 15
+CLUSTER_RADIUS_PX = 60
+MAX_PAGE_SIZE = 2000
+
+# Loaded cafe tables and their spatial indexes, keyed by city_id
+_city_cafes: Dict[str, Dict] = {}
+# One store reload / Overpass fetch per city at a time
+_reload_flight = SingleFlight("cafes")
+
+def _meta_path(city_id: str) -> str:
+    return os.path.join(CACHE_DIR, f"{CACHE_FILE_PREFIX}{city_id}.json")
+
+def _coords_path(city_id: str, generation: str) -> str:
+    return os.path.join(CACHE_DIR, f"{CACHE_FILE_PREFIX}{city_id}.{generation}.npy")
+
+def _store_mtime(city_id: str) -> Optional[float]:
+    try:
+        return os.path.getmtime(_meta_path(city_id))
+    except OSError:
+        return None
+
+def _make_table(coords: np.ndarray, names: List[str], amenities: List[str], timestamp: float, mtime: Optional[float]) -> Dict:
+    return {
+        "timestamp": timestamp,
+        "mtime": mtime,
+        "coords": coords,
+        "names": names,
+        "amenities": amenities,
+        "index": SpatialIndex(coords["lat"], coords["lon"]),
+        "cafes": None  # dict records, built on first get_cafes call
+    }
+
+def _table_records(table: Dict) -> List[Dict]:
+    coords = table["coords"]
+    ids = coords["id"].tolist()
+    return [
+        {
+            "id": cafe_id if cafe_id >= 0 else None,
+            "name": name,
+            "lat": lat,
+            "lon": lon,
+            "type": "competitor",
+            "amenity": amenity
+        }
+        for cafe_id, name, lat, lon, amenity in zip(
+            ids, table["names"], coords["lat"].tolist(), coords["lon"].tolist(), table["amenities"]
+        )
+    ]
+
+def _write_store(city_id: str, cafes: List[Dict], timestamp: float) -> Dict:
+    """Persist cafes atomically and return the matching in-memory table."""
+    coords = np.array(
+        [(c["lat"], c["lon"], c["id"] if c.get("id") is not None else -1) for c in cafes],
+        dtype=COORD_DTYPE
+    )
+    names = [c["name"] for c in cafes]
+    amenities = [c["amenity"] for c in cafes]
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        generation = f"{int(timestamp * 1000)}-{os.getpid()}"
+        coords_path = _coords_path(city_id, generation)
+        with open(coords_path + ".tmp", "wb") as f:
+            np.save(f, coords)
+        os.replace(coords_path + ".tmp", coords_path)
+
+        # Per-process temp name: other workers may be writing the same store
+        meta_path = _meta_path(city_id)
+        tmp_path = f"{meta_path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "timestamp": timestamp,
+                "generation": generation,
+                "count": len(coords),
+                "names": names,
+                "amenities": amenities
+            }, f)
+        os.replace(tmp_path, meta_path)
+
+        _remove_old_generations(city_id, timestamp)
+    except Exception as e:
+        print(f"Cache write error: {e}")
+
+    return _make_table(coords, names, amenities, timestamp, _store_mtime(city_id))
+
+def _remove_old_generations(city_id: str, timestamp: float):
     """
-    Fetch cafe locations for a specific city using Overpass API (OSM).
-    Returns a list of cafes with their coordinates and names.
-    Uses local caching to avoid hitting API rate limits.
+    Delete .npy generations older than the one just written. Files another
+    worker wrote in the last STORE_GC_GRACE seconds are kept even if older:
+    its meta may be about to name them. Workers that still map a deleted
+    file keep their view.
     """
-    if city_id not in CITIES:
-        return [{"error": f"Invalid city_id: {city_id}"}]
-        
-    city_config = CITIES[city_id]
-    bbox = city_config['bbox']
-    cache_file = f"{CACHE_FILE_PREFIX}{city_id}.json"
+    prefix = f"{CACHE_FILE_PREFIX}{city_id}."
+    now = time.time()
+    for filename in os.listdir(CACHE_DIR):
+        if not (filename.startswith(prefix) and filename.endswith(".npy")):
+            continue
+        path = os.path.join(CACHE_DIR, filename)
+        try:
+            written_ms = int(filename[len(prefix):].split("-", 1)[0])
+            if written_ms < int(timestamp * 1000) and now - os.path.getmtime(path) > STORE_GC_GRACE:
+                os.remove(path)
+        except (ValueError, OSError):
+            continue
 
-    # Check cache first
-    if os.path.exists(cache_file):
+def _read_store(city_id: str) -> Optional[Dict]:
+    """Load a city's store from disk, memory-mapping the coordinate column."""
+    mtime = _store_mtime(city_id)
+    if mtime is None:
+        return None
+    with open(_meta_path(city_id), "r") as f:
+        meta = json.load(f)
+    coords = np.load(_coords_path(city_id, meta["generation"]), mmap_mode="r")
+    if len(coords) != meta["count"]:
+        raise ValueError(f"Cafe store for {city_id} is inconsistent")
+    return _make_table(coords, meta["names"], meta["amenities"], meta["timestamp"], mtime)
+
+def _read_legacy_cache(city_id: str) -> Optional[Dict]:
+    """Import an old JSON cache file (if any) into the new store."""
+    legacy_file = f"{LEGACY_CACHE_FILE_PREFIX}{city_id}.json"
+    if not os.path.exists(legacy_file):
+        return None
+    with open(legacy_file, "r") as f:
+        cache_data = json.load(f)
+    return _write_store(city_id, cache_data["cafes"], cache_data["timestamp"])
+
+def _is_fresh(table: Optional[Dict]) -> bool:
+    return table is not None and time.time() - table["timestamp"] < CACHE_DURATION
+
+async def _load_table(city_id: str) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    Get a city's cafe table: from memory while the on-disk store is unchanged
+    (mtime) and within CACHE_DURATION, else from disk, else from Overpass.
+    Returns (table, error); a stale table is returned if fetching fails.
+    Disk reads/writes and index builds run in a worker thread.
+    Only one reload per city runs at a time; while it does, callers that
+    already have a table get it as-is and the rest wait for the reload.
+    """
+    entry = _city_cafes.get(city_id)
+    if _is_fresh(entry) and entry["mtime"] == _store_mtime(city_id):
+        record_cache("cafes", "hit")
+        return entry, None
+
+    if entry is not None and _reload_flight.in_flight(city_id):
+        record_cache("cafes", "stale")
+        return entry, None
+    return await _reload_flight.do(city_id, lambda: _reload_table(city_id))
+
+async def _reload_table(city_id: str) -> Tuple[Optional[Dict], Optional[str]]:
+    """Slow path of _load_table: disk store, then legacy cache, then Overpass."""
+    entry = _city_cafes.get(city_id)
+    mtime = _store_mtime(city_id)
+    if _is_fresh(entry) and entry["mtime"] == mtime:
+        record_cache("cafes", "hit")
+        return entry, None
+
+    # Reload from disk if another worker/process rewrote the store
+    if mtime is not None and (entry is None or entry["mtime"] != mtime):
         try:
-            with open(cache_file, "r") as f:
-                cache_data = json.load(f)
-                if time.time() - cache_data["timestamp"] < CACHE_DURATION:
-                    print(f"Using cached cafe data for {city_id}")
-                    return cache_data["cafes"]
+            table = await asyncio.to_thread(_read_store, city_id)
+            if table is not None:
+                entry = _city_cafes[city_id] = table
         except Exception as e:
             print(f"Cache read error: {e}")
+    elif entry is None:
+        try:
+            entry = await asyncio.to_thread(_read_legacy_cache, city_id)
+            if entry is not None:
+                _city_cafes[city_id] = entry
+        except Exception as e:
+            print(f"Legacy cache read error: {e}")
+
+    if _is_fresh(entry):
+        print(f"Using cached cafe data for {city_id}")
+        record_cache("cafes", "hit")
+        return entry, None
+
+    cafes, error = await fetch_cafes(city_id)
+    if cafes is not None:
+        record_cache("cafes", "miss")
+        _city_cafes[city_id] = await asyncio.to_thread(_write_store, city_id, cafes, time.time())
+        return _city_cafes[city_id], None
+
+    # Fall back to stale data if available
+    record_cache("cafes", "stale" if entry is not None else "miss")
+    return entry, error
+
+async def get_cafe_index(city_id: str = DEFAULT_CITY_ID) -> SpatialIndex:
+    """
+    Get the spatial index over a city's cafes for nearest/density queries.
+    Built once whenever the city's cafe table is loaded.
+    """
+    table, _ = await _load_table(city_id) if city_id in CITIES else (None, None)
+    if table is None:
+        return SpatialIndex([], [])
+    return table["index"]
+
+async def get_cafes_version(city_id: str = DEFAULT_CITY_ID) -> Optional[float]:
+    """
+    Version of a city's cafe data (the fetch timestamp of the loaded table),
+    or None if there is none. Loads the table if needed.
+    """
+    table, _ = await _load_table(city_id) if city_id in CITIES else (None, None)
+    return table["timestamp"] if table is not None else None
+
+async def get_cafes(city_id: str = DEFAULT_CITY_ID) -> List[Dict]:
+    """
+    Get cafe locations for a specific city.
+    Returns a list of cafes with their coordinates and names.
+    Served from memory / the on-disk store to avoid hitting API rate limits.
+    """
+    if city_id not in CITIES:
+        return [{"error": f"Invalid city_id: {city_id}"}]
+
+    table, error = await _load_table(city_id)
+    if table is None:
+        return [{"error": error}]
+    return _cafe_records(table)
+
+async def get_cafe_snapshot(city_id: str = DEFAULT_CITY_ID) -> Tuple[SpatialIndex, List[Dict], Optional[float]]:
+    """
+    (spatial index, cafe records, version) of a city from a single table load,
+    so index rows line up with the records even if a reload lands meanwhile.
+    """
+    table, _ = await _load_table(city_id) if city_id in CITIES else (None, None)
+    if table is None:
+        return SpatialIndex([], []), [], None
+    return table["index"], _cafe_records(table), table["timestamp"]
+
+def _cafe_records(table: Dict) -> List[Dict]:
+    """The table's cafe dicts, built on first use."""
+    if table["cafes"] is None:
+        table["cafes"] = _table_records(table)
+    return table["cafes"]
+
+async def query_cafes(
+    city_id: str = DEFAULT_CITY_ID,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    zoom: Optional[int] = None,
+    offset: int = 0,
+    limit: int = MAX_PAGE_SIZE
+) -> Dict:
+    """
+    Cafes inside a viewport, answered from the city's spatial index.
+
+    bbox is (south, west, north, east); without it the whole city is used.
+    Below CLUSTER_MAX_ZOOM, cafes sharing a screen-space cell are merged
+    into {"lat", "lon", "count"} clusters and only single cafes are listed.
+    The cafe list is paginated with offset/limit; "next_offset" is None on
+    the last page.
+    """
+    if city_id not in CITIES:
+        return {"error": f"Invalid city_id: {city_id}"}
+
+    table, error = await _load_table(city_id)
+    if table is None:
+        return {"error": error}
+    records = _cafe_records(table)
+    index = table["index"]
+
+    if bbox is None:
+        rows = np.arange(index.size)
+    else:
+        rows = index.query_bbox(*bbox)
+
+    clusters = []
+    if zoom is not None and zoom < CLUSTER_MAX_ZOOM and len(rows):
+        cluster_lats, cluster_lons, counts, labels = cluster_points(index.lats[rows], index.lons[rows], zoom, CLUSTER_RADIUS_PX)
+        clusters = [
+            {"lat": lat, "lon": lon, "count": count}
+            for lat, lon, count in zip(cluster_lats.tolist(), cluster_lons.tolist(), counts.tolist())
+            if count > 1
+        ]
+        rows = rows[counts[labels] == 1]
+
+    limit = max(0, min(limit, MAX_PAGE_SIZE))
+    page = rows[offset:offset + limit]
+    next_offset = offset + limit if offset + limit < len(rows) else None
+    return {
+        "total": int(len(rows)),
+        "clusters": clusters,
+        "cafes": [records[i] for i in page.tolist()],
+        "offset": offset,
+        "limit": limit,
+        "next_offset": next_offset
+    }
+
+async def fetch_cafes(city_id: str) -> Tuple[Optional[List[Dict]], Optional[str]]:
+    """
+    Fetch cafe locations for a city from the Overpass API (OSM).
+    Returns (cafes, None) on success or (None, error message).
+    """
+    bbox = CITIES[city_id]['bbox']
 
-    overpass_url = "https://overpass-api.de/api/interpreter"
-    
     # Expanded Overpass QL query
     # Strictly coffee-centric: Cafes and Bakeries only.
     query = f"""
@@ -49,7 +336,7 @@ def get_cafes(city_id: str = DEFAULT_CITY_ID) -> List[Dict]:
     
     try:
         print(f"Fetching fresh cafe data for {city_id} from Overpass API...")
-        response = requests.post(overpass_url, data={"data": query}, timeout=60)
+        response = await get_http_client().post(OVERPASS_URL, data={"data": query}, timeout=OVERPASS_TIMEOUT)
         response.raise_for_status()
         data = response.json()
         
@@ -79,24 +366,7 @@ def get_cafes(city_id: str = DEFAULT_CITY_ID) -> List[Dict]:
                 "amenity": amenity
             })
         
-        # Save to cache
-        try:
-            with open(cache_file, "w") as f:
-                json.dump({
-                    "timestamp": time.time(),
-                    "cafes": cafes
-                }, f)
-        except Exception as e:
-            print(f"Cache write error: {e}")
-            
-        return cafes
+        return cafes, None
     except Exception as e:
         print(f"Error fetching cafes: {e}")
-        # Try to return stale cache if available
-        if os.path.exists(cache_file):
-            try:
-                with open(cache_file, "r") as f:
-                    return json.load(f)["cafes"]
-            except:
-                pass
-        return [{"error": str(e)}]
+        return None, str(e)
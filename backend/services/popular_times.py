@@ -1,12 +1,193 @@
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from contextlib import asynccontextmanager
+import asyncio
 import re
 import json
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 import time
+from .cache import AsyncTTLCache
+from .traffic import BUSYNESS_MULTIPLIERS
+import datetime
 
-def get_popular_times(place_name: str, location: str = "Copenhagen") -> Dict:
+# Browser pool settings
+POOL_SIZE = 8  # concurrent pages in the pool
+PAGE_MAX_USES = 50  # recycle a context after this many scrapes to shed leaked tabs/memory
+SCRAPE_TIMEOUT = 60  # seconds for a whole scrape, including waiting for a page
+NAVIGATION_TIMEOUT_MS = 30000
+CONTENT_READY_SELECTOR = 'div[role="main"]'  # Maps place/search panel
+CONTENT_READY_TIMEOUT_MS = 10000
+
+# Fan-out settings
+FANOUT_CONCURRENCY = 8  # max places scraped at once per request
+PLACE_TIMEOUT = 20  # seconds per place before falling back to an estimate
+
+# Result cache settings
+CACHE_TTL = 15 * 60  # seconds a scraped result is served as fresh
+CACHE_ERROR_TTL = 2 * 60  # failed/estimated results are retried sooner
+CACHE_MAX_ENTRIES = 2000  # LRU bound on (place, city) entries
+
+def _maps_url(place_name: str, location: str) -> str:
+    # Search for the place on Google Maps
+    search_query = f"{place_name} {location}"
+    return f"https://www.google.com/maps/search/{search_query.replace(' ', '+')}"
+
+def _extract_popularity(page_content: str) -> Optional[int]:
+    """Pull the current busyness percentage out of a Maps page's HTML."""
+    current_popularity = None
+    
+    # Look for percentage indicators
+    percentage_matches = re.findall(r'(\d+)%', page_content)
+    if percentage_matches:
+        # Take the first reasonable percentage (0-100)
+        for match in percentage_matches:
+            val = int(match)
+            if 0 <= val <= 100:
+                current_popularity = val
+                break
+    
+    # Look for live indicator
+    if 'Live' in page_content or 'live' in page_content:
+        # Extract live busyness if available
+        live_matches = re.findall(r'Live.*?(\d+)%', page_content, re.DOTALL)
+        if live_matches:
+            current_popularity = int(live_matches[0])
+    
+    return current_popularity
+
+def _popularity_result(place_name: str, current_popularity: Optional[int]) -> Dict:
+    # If we found data, return it
+    if current_popularity is not None:
+        return {
+            "place_name": place_name,
+            "current_popularity": current_popularity,
+            "data_available": True,
+            "timestamp": time.time()
+        }
+    # Return default/estimated data
+    return {
+        "place_name": place_name,
+        "current_popularity": estimate_busyness(place_name),
+        "data_available": False,
+        "timestamp": time.time(),
+        "note": "Using estimated data - Popular Times not available"
+    }
+
+def _fallback_result(place_name: str, error: str) -> Dict:
+    return {
+        "place_name": place_name,
+        "current_popularity": estimate_busyness(place_name),
+        "data_available": False,
+        "timestamp": time.time(),
+        "error": error
+    }
+
+class BrowserPool:
+    """
+    Long-lived, bounded pool of headless Chromium pages for the event loop.
+
+    One Chromium instance is shared; up to `size` contexts/pages are open at
+    once and handed out to concurrent scrapes. Pages that fail, get cancelled
+    (e.g. by a timeout) or reach PAGE_MAX_USES are closed and replaced.
+    """
+
+    def __init__(self, size: int = POOL_SIZE):
+        self.size = size
+        self._playwright = None
+        self._browser = None
+        self._idle: List[Dict] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._launch_lock: Optional[asyncio.Lock] = None
+
+    async def _get_browser(self):
+        if self._launch_lock is None:
+            self._launch_lock = asyncio.Lock()
+        async with self._launch_lock:
+            if self._browser is None or not self._browser.is_connected():
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=True)
+                self._idle = []
+            return self._browser
+
+    @asynccontextmanager
+    async def page(self):
+        """Borrow a pooled page for the duration of the block."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.size)
+        async with self._semaphore:
+            browser = await self._get_browser()
+            slot = self._idle.pop() if self._idle else None
+            if slot is None:
+                context = await browser.new_context()
+                slot = {"context": context, "page": await context.new_page(), "uses": 0}
+
+            healthy = False
+            try:
+                slot["uses"] += 1
+                yield slot["page"]
+                healthy = not slot["page"].is_closed()
+            finally:
+                if healthy and slot["uses"] < PAGE_MAX_USES:
+                    for extra in slot["context"].pages:
+                        if extra is not slot["page"]:
+                            asyncio.ensure_future(_aclose_quietly(extra))
+                    self._idle.append(slot)
+                else:
+                    asyncio.ensure_future(_aclose_quietly(slot["context"]))
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for slot in idle:
+            await _aclose_quietly(slot["context"])
+        await _aclose_quietly(self._browser)
+        self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+async def _aclose_quietly(resource):
+    if resource is None:
+        return
+    try:
+        await resource.close()
+    except Exception:
+        pass
+
+# Shared pool, started lazily on first scrape in the event loop
+browser_pool = BrowserPool()
+
+async def shutdown_browser_pool():
+    await browser_pool.close()
+
+async def _scrape_popularity(page, place_name: str, location: str) -> Optional[int]:
+    """Load the Maps search for a place and pull out its current busyness."""
+    await page.goto(_maps_url(place_name, location), timeout=NAVIGATION_TIMEOUT_MS)
+    try:
+        # Wait for the results panel instead of sleeping a fixed time
+        await page.wait_for_selector(CONTENT_READY_SELECTOR, timeout=CONTENT_READY_TIMEOUT_MS)
+    except PlaywrightTimeoutError:
+        return None
+    
+    # Look for "Popular times" section
+    try:
+        # Google shows this as "Usually X% as busy as it gets"
+        popular_section = page.locator('text="Popular times"').first
+        if await popular_section.is_visible(timeout=5000):
+            return _extract_popularity(await page.content())
+    except Exception as e:
+        print(f"Could not find popular times section: {e}")
+    
+    return None
+
+async def _scrape_with_pool(place_name: str, location: str) -> Optional[int]:
+    async with browser_pool.page() as page:
+        return await _scrape_popularity(page, place_name, location)
+
+async def get_popular_times(place_name: str, location: str = "Copenhagen", timeout: float = SCRAPE_TIMEOUT) -> Dict:
     """
     Scrape Google Maps Popular Times data for a given place.
+    Runs on a page from the shared browser pool; gives up (and closes the
+    page) after `timeout` seconds.
     
     Args:
         place_name: Name of the place (e.g., "Nyhavn")
@@ -16,119 +197,78 @@ def get_popular_times(place_name: str, location: str = "Copenhagen") -> Dict:
         Dict with current_popularity and popular_times data
     """
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            
-            # Search for the place on Google Maps
-            search_query = f"{place_name} {location}"
-            maps_url = f"https://www.google.com/maps/search/{search_query.replace(' ', '+')}"
-            
-            page.goto(maps_url, timeout=30000)
-            time.sleep(3)  # Wait for page to load
-            
-            # Try to find popular times data
-            current_popularity = None
-            popular_times = {}
-            
-            # Look for "Popular times" section
-            try:
-                # Check if "Popular times" text exists
-                popular_section = page.locator('text="Popular times"').first
-                if popular_section.is_visible(timeout=5000):
-                    # Try to extract current busyness
-                    # Google shows this as "Usually X% as busy as it gets"
-                    page_content = page.content()
-                    
-                    # Look for percentage indicators
-                    percentage_matches = re.findall(r'(\d+)%', page_content)
-                    if percentage_matches:
-                        # Take the first reasonable percentage (0-100)
-                        for match in percentage_matches:
-                            val = int(match)
-                            if 0 <= val <= 100:
-                                current_popularity = val
-                                break
-                    
-                    # Look for live indicator
-                    if 'Live' in page_content or 'live' in page_content:
-                        # Extract live busyness if available
-                        live_matches = re.findall(r'Live.*?(\d+)%', page_content, re.DOTALL)
-                        if live_matches:
-                            current_popularity = int(live_matches[0])
-            except Exception as e:
-                print(f"Could not find popular times section: {e}")
-            
-            browser.close()
-            
-            # If we found data, return it
-            if current_popularity is not None:
-                return {
-                    "place_name": place_name,
-                    "current_popularity": current_popularity,
-                    "data_available": True,
-                    "timestamp": time.time()
-                }
-            else:
-                # Return default/estimated data
-                return {
-                    "place_name": place_name,
-                    "current_popularity": estimate_busyness(place_name),
-                    "data_available": False,
-                    "timestamp": time.time(),
-                    "note": "Using estimated data - Popular Times not available"
-                }
-                
+        current_popularity = await asyncio.wait_for(_scrape_with_pool(place_name, location), timeout)
+        return _popularity_result(place_name, current_popularity)
+    except asyncio.TimeoutError:
+        print(f"Popular times scrape for {place_name} timed out after {timeout}s")
+        return _fallback_result(place_name, f"Timed out after {timeout}s")
     except Exception as e:
         print(f"Error scraping popular times for {place_name}: {e}")
-        return {
-            "place_name": place_name,
-            "current_popularity": estimate_busyness(place_name),
-            "data_available": False,
-            "error": str(e)
-        }
+        return _fallback_result(place_name, str(e))
 
-def estimate_busyness(place_name: str) -> int:
+# Per-(place, city) results, served stale while a background refresh runs
+popular_times_cache = AsyncTTLCache(
+    name="popular_times",
+    ttl=CACHE_TTL,
+    max_size=CACHE_MAX_ENTRIES,
+    ttl_for=lambda result: CACHE_TTL if result.get("data_available") else CACHE_ERROR_TTL
+)
+
+async def get_popular_times_cached(place_name: str, location: str = "Copenhagen") -> Dict:
+    """
+    Cached get_popular_times.
+    Answers from memory when possible; expired entries are returned as-is
+    and refreshed in the background (one refresh per place at a time).
+    """
+    return await popular_times_cache.get(
+        (place_name, location),
+        lambda: get_popular_times(place_name, location)
+    )
+
+async def fetch_popular_times_many(
+    place_names: List[str],
+    location: str = "Copenhagen",
+    concurrency: int = FANOUT_CONCURRENCY,
+    timeout: float = PLACE_TIMEOUT
+) -> List[Dict]:
+    """
+    Fetch Popular Times for many places concurrently.
+
+    Results come from the popular times cache where available. At most
+    `concurrency` scrapes run at once and each place gets `timeout` seconds;
+    places that time out fall back to estimate_busyness (the scrape keeps
+    running and fills the cache). Results are returned in the same order as
+    place_names.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch_one(place_name: str) -> Dict:
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(get_popular_times_cached(place_name, location), timeout)
+            except asyncio.TimeoutError:
+                print(f"Popular times for {place_name} timed out after {timeout}s")
+                return _fallback_result(place_name, f"Timed out after {timeout}s")
+
+    return await asyncio.gather(*(fetch_one(name) for name in place_names))
+
+# Base busyness levels for known tourist spots
+BASE_BUSYNESS_LEVELS = {
+    "Nyhavn": 85,
+    "Strøget": 80,
+    "Nørreport Station": 75,
+    "Tivoli Gardens": 80,
+    "Kongens Nytorv": 70,
+    "Christiansborg": 65,
+    "The Round Tower": 60,
+}
+
+def estimate_busyness(place_name: str, now: Optional[datetime.datetime] = None) -> int:
     """
     Estimate busyness based on place name and current time.
-    Fallback when scraping fails.
+    Fallback when scraping fails. Time-of-day/weekend multipliers come
+    from the precompiled traffic.BUSYNESS_MULTIPLIERS table.
     """
-    import datetime
-    
-    # Get current hour (Copenhagen time - UTC+1)
-    now = datetime.datetime.now()
-    hour = now.hour
-    day_of_week = now.weekday()  # 0=Monday, 6=Sunday
-    
-    # Base busyness levels for known tourist spots
-    base_levels = {
-        "Nyhavn": 85,
-        "Strøget": 80,
-        "Nørreport Station": 75,
-        "Tivoli Gardens": 80,
-        "Kongens Nytorv": 70,
-        "Christiansborg": 65,
-        "The Round Tower": 60,
-    }
-    
-    base = base_levels.get(place_name, 50)
-    
-    # Time-based adjustments
-    if hour < 7 or hour > 22:  # Early morning / late night
-        multiplier = 0.2
-    elif 7 <= hour < 10:  # Morning
-        multiplier = 0.5
-    elif 10 <= hour < 14:  # Midday
-        multiplier = 0.9
-    elif 14 <= hour < 18:  # Afternoon
-        multiplier = 1.0
-    elif 18 <= hour < 22:  # Evening
-        multiplier = 0.8
-    else:
-        multiplier = 0.3
-    
-    # Weekend boost
-    if day_of_week >= 5:  # Saturday or Sunday
-        multiplier *= 1.2
-    
-    return min(100, int(base * multiplier))
+    now = now or datetime.datetime.now()
+    base = BASE_BUSYNESS_LEVELS.get(place_name, 50)
+    return min(100, int(base * BUSYNESS_MULTIPLIERS[now.weekday(), now.hour]))
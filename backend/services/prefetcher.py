@@ -0,0 +1,92 @@
+"""
+Background prefetcher for live hotspot busyness.
+
+Runs inside the FastAPI app: every PREFETCH_INTERVAL seconds it sweeps all
+hotspots of every city in CITIES and keeps the latest result per place in a
+per-city snapshot, so live endpoints never have to scrape on request.
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Set
+
+from ..config import CITIES
+from ..hotspots import get_hotspots
+from .popular_times import get_popular_times, popular_times_cache
+
+PREFETCH_ENABLED = os.environ.get("NOMNOM_PREFETCH", "1") == "1"
+PREFETCH_INTERVAL = 15 * 60  # seconds per full sweep of all cities
+PREFETCH_CONCURRENCY = 4  # max scrapes in flight at once
+
+
+class BusynessPrefetcher:
+    """
+    Periodically scrapes every hotspot and stores a snapshot per city.
+
+    Scrapes are started at evenly spaced times across the interval
+    (interval / number of places apart) instead of all at once.
+    """
+
+    def __init__(self, interval: float = PREFETCH_INTERVAL, concurrency: int = PREFETCH_CONCURRENCY):
+        self.interval = interval
+        self.concurrency = concurrency
+        self._snapshots: Dict[str, Dict] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
+
+    def get_snapshot(self, city_id: str) -> Optional[Dict]:
+        """
+        Latest snapshot for a city, or None before the first result lands.
+        {"places": {name: result}, "updated_at": ts, "sweep_started_at": ts}
+        """
+        return self._snapshots.get(city_id)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        tasks = list(self._inflight)
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _places(self) -> List[Dict]:
+        places = []
+        for city_id, city in CITIES.items():
+            for spot in get_hotspots(city_id):
+                places.append({"city_id": city_id, "city_name": city["name"], "name": spot["name"]})
+        return places
+
+    async def _run(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        while True:
+            places = self._places()
+            spacing = self.interval / max(1, len(places))
+            sweep_started_at = time.time()
+
+            for place in places:
+                task = asyncio.ensure_future(self._fetch(place, semaphore, sweep_started_at))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+                await asyncio.sleep(spacing)
+
+    async def _fetch(self, place: Dict, semaphore: asyncio.Semaphore, sweep_started_at: float):
+        async with semaphore:
+            result = await get_popular_times(place["name"], place["city_name"])
+
+        fetched_at = time.time()
+        popular_times_cache.set((place["name"], place["city_name"]), result)
+
+        snapshot = self._snapshots.setdefault(place["city_id"], {"places": {}})
+        snapshot["places"][place["name"]] = dict(result, fetched_at=fetched_at)
+        snapshot["updated_at"] = fetched_at
+        snapshot["sweep_started_at"] = sweep_started_at
+
+
+# Shared instance, started/stopped from the app lifespan
+busyness_prefetcher = BusynessPrefetcher()
@@ -0,0 +1,89 @@
+"""
+Pre-serialized response cache for read-mostly endpoints.
+
+Bodies are stored as JSON bytes together with a strong ETag, keyed on
+(route, query) and tagged with the data version they were rendered from.
+A lookup with a different version re-renders the entry.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from .compression import COMPRESSION_MIN_SIZE, compress, is_compressible
+from .metrics import record_cache
+from .serialization import dumps
+
+RESPONSE_CACHE_MAX_ENTRIES = 256
+
+
+def make_etag(body: bytes) -> str:
+    return '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 requires for GET)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """LRU of rendered bodies: key -> {"version", "body", "etag", "encoded"}."""
+
+    def __init__(self, name: str = "responses", max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, serialize: Callable[[Any], bytes] = dumps):
+        self.name = name
+        self.max_entries = max_entries
+        self.serialize = serialize  # JSON by default; binary caches pass bytes through
+        self._entries: "OrderedDict[Hashable, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: Hashable, render: Callable[[], Any]) -> Dict:
+        """
+        Cached body for key at this data version; renders and stores it on a miss.
+        A version of None means the data isn't cacheable (e.g. an error) and is
+        rendered every time.
+        """
+        if version is not None:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry["version"] == version:
+                    self._entries.move_to_end(key)
+                    record_cache(self.name, "hit")
+                    return entry
+
+        record_cache(self.name, "miss")
+        body = self.serialize(render())
+        entry = {"version": version, "body": body, "etag": make_etag(body), "encoded": {}}
+        if version is not None:
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def encoded_body(self, entry: Dict, encoding: Optional[str], media_type: str = "application/json") -> Optional[bytes]:
+        """
+        Compressed body for an entry, compressed once and kept alongside it.
+        None if the body should go out uncompressed (small, or a media type
+        that doesn't compress, like PNG).
+        """
+        if encoding is None or len(entry["body"]) < COMPRESSION_MIN_SIZE or not is_compressible(media_type):
+            return None
+        body = entry["encoded"].get(encoding)
+        if body is None:
+            body = entry["encoded"][encoding] = compress(entry["body"], encoding)
+        return body
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = ResponseCache()
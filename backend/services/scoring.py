@@ -0,0 +1,300 @@
+"""
+Vectorized scoring engine for hotspots.
+
+Holds hotspots, cafes and events as coordinate arrays and computes event
+boosts, cafe competition and business scores for a whole city in one pass.
+Results match the per-spot logic in business_score.calculate_business_score.
+"""
+
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from .event_index import EMPTY_EVENT_INDEX, EventIndex
+from .traffic import resolve_time
+from .spatial import SpatialIndex
+from .permit_info import get_permit_status, get_permits_version
+
+DENSITY_RADIUS = 400  # meters, same as calculate_cafe_density
+NO_CAFE_DISTANCE = 500  # meters, same default as find_nearest_cafe
+
+# Mirrors get_density_label thresholds (index 0=Low, 1=Medium, 2=High)
+DENSITY_LABELS = [
+    {"label": "Low", "color": "#94a3b8", "score_boost": 0},
+    {"label": "Medium", "color": "#eab308", "score_boost": 10},
+    {"label": "High", "color": "#22c55e", "score_boost": 20},
+]
+
+# Mirrors calculate_business_score thresholds (index 0=poor ... 3=excellent)
+RECOMMENDATIONS = [
+    ("poor", "#ef4444"),
+    ("moderate", "#f59e0b"),
+    ("good", "#eab308"),
+    ("excellent", "#22c55e"),
+]
+
+
+class HotspotBatch:
+    """A city's hotspots as coordinate arrays."""
+
+    def __init__(self, hotspots: List[Dict]):
+        self.hotspots = hotspots
+        self.lats = np.array([h["lat"] for h in hotspots], dtype=np.float64)
+        self.lons = np.array([h["lon"] for h in hotspots], dtype=np.float64)
+        self.types = [h["type"] for h in hotspots]
+        self._type_codes: Dict[int, np.ndarray] = {}
+
+    def type_codes(self, model) -> np.ndarray:
+        """Spot type codes for a TrafficModel, computed once per model."""
+        codes = self._type_codes.get(id(model))
+        if codes is None:
+            codes = self._type_codes[id(model)] = model.type_codes(self.types)
+        return codes
+
+    def __len__(self):
+        return len(self.hotspots)
+
+
+# Hotspot lists are static module data, so their arrays are built once per city
+_batches: Dict[str, HotspotBatch] = {}
+
+def get_hotspot_batch(city_id: str, hotspots: List[Dict]) -> HotspotBatch:
+    """Get (and cache) the array form of a city's hotspot list."""
+    batch = _batches.get(city_id)
+    if batch is None or batch.hotspots is not hotspots:
+        batch = HotspotBatch(hotspots)
+        _batches[city_id] = batch
+    return batch
+
+
+def density_levels(cafe_density: np.ndarray) -> np.ndarray:
+    """Vectorized get_density_label: 0=Low, 1=Medium, 2=High."""
+    return (cafe_density >= 2).astype(np.int64) + (cafe_density >= 5).astype(np.int64)
+
+
+def recommendation_levels(business_score: np.ndarray) -> np.ndarray:
+    """Vectorized recommendation thresholds: 0=poor ... 3=excellent."""
+    return (
+        (business_score >= 40).astype(np.int64)
+        + (business_score >= 60).astype(np.int64)
+        + (business_score >= 80).astype(np.int64)
+    )
+
+
+def _as_event_index(events: Union[EventIndex, List[Dict], None]) -> EventIndex:
+    if isinstance(events, EventIndex):
+        return events
+    return EventIndex(events) if events else EMPTY_EVENT_INDEX
+
+
+def event_boosts(lats: np.ndarray, lons: np.ndarray, events: Union[EventIndex, List[Dict], None], hour: Optional[int] = None) -> np.ndarray:
+    """
+    Max traffic boost per point at `hour` (full boosts if None).
+    Takes an EventIndex (see events.get_event_index) or a plain event list.
+    """
+    return _as_event_index(events).boosts(lats, lons, hour)
+
+
+def hotspot_event_table(batch: HotspotBatch, events: Union[EventIndex, List[Dict], None]) -> Dict:
+    """The batch's precomputed hotspot x hour event boosts (see EventIndex.point_table)."""
+    return _as_event_index(events).point_table(batch, batch.lats, batch.lons)
+
+
+# Static per-city columns, keyed by city_id
+_static_columns: Dict[str, Dict] = {}
+
+def get_static_columns(city_id: str, batch: HotspotBatch, cafe_index: SpatialIndex) -> Dict:
+    """
+    Score components that only depend on hotspots, cafes and permits.
+
+    Materialized once per city and rebuilt when the hotspot list, the cafe
+    index (a new one is built whenever cafe data reloads) or the permit
+    table version changes.
+    """
+    permits_version = get_permits_version()
+    static = _static_columns.get(city_id)
+    if (
+        static is not None
+        and static["batch"] is batch
+        and static["cafe_index"] is cafe_index
+        and static["permits_version"] == permits_version
+    ):
+        return static
+
+    nearest = cafe_index.nearest_many(batch.lats, batch.lons)
+    nearest = np.where(np.isinf(nearest), NO_CAFE_DISTANCE, nearest)
+    cafe_density = cafe_index.count_within_many(batch.lats, batch.lons, DENSITY_RADIUS)
+    density_level = density_levels(cafe_density)
+
+    static = {
+        "batch": batch,
+        "cafe_index": cafe_index,
+        "permits_version": permits_version,
+        "nearest_cafe_distance": nearest,
+        "cafe_density": cafe_density,
+        "density_level": density_level,
+        "competition_score": np.array([d["score_boost"] for d in DENSITY_LABELS])[density_level] * 1.5,
+        "permits": [get_permit_status(h["name"], city_id) for h in batch.hotspots],
+    }
+    _static_columns[city_id] = static
+    return static
+
+
+def compute_scores(
+    batch: HotspotBatch,
+    traffic: Sequence[int],
+    static: Dict,
+    weather_suitable: bool,
+    events: Union[EventIndex, List[Dict], None] = None,
+    hour: Optional[int] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Score every hotspot in the batch at once.
+
+    Only the time-varying parts (traffic, event boost, weather) are computed
+    here; cafe competition comes from get_static_columns. Event boosts are
+    taken for `hour` (default: the current hour).
+    Returns a dict of column arrays (one entry per hotspot, in batch order).
+    """
+    if hour is None:
+        _, hour = resolve_time()
+    original_traffic = np.asarray(traffic, dtype=np.int64)
+    event_table = hotspot_event_table(batch, events)
+    boosts = event_table["timeline"][:, hour]
+    traffic_level = np.minimum(100, original_traffic + boosts)
+
+    nearest = static["nearest_cafe_distance"]
+    cafe_density = static["cafe_density"]
+    density_level = static["density_level"]
+
+    traffic_score = traffic_level * 0.5
+    competition_score = static["competition_score"]
+    weather_score = 100 * 0.2 if weather_suitable else 0
+    business_score = traffic_score + competition_score + weather_score
+
+    return {
+        "original_traffic": original_traffic,
+        "traffic_level": traffic_level,
+        "event_boost": boosts,
+        "event_pairs": event_table["pairs"],
+        "event_pair_starts": event_table["pair_starts"],
+        "event_pair_boost": event_table["pair_boost"][:, hour],
+        "nearest_cafe_distance": nearest,
+        "cafe_density": cafe_density,
+        "density_level": density_level,
+        "traffic_score": traffic_score,
+        "competition_score": competition_score,
+        "weather_score": np.full(len(batch), weather_score, dtype=np.float64),
+        "business_score": business_score,
+        "recommendation_level": recommendation_levels(business_score),
+    }
+
+
+def compute_score_grid(
+    traffic: np.ndarray,
+    static: Dict,
+    event_timeline: np.ndarray,
+    weather_suitable_by_hour: Sequence[bool],
+) -> Dict[str, np.ndarray]:
+    """
+    Scores for every (day, hour, hotspot) at once.
+
+    `traffic` has shape (days, 24, hotspots) and `event_timeline` (hotspots, 24);
+    weather suitability is per hour. Uses the same arithmetic as
+    compute_scores, so each cell matches what /api/hotspots-scored returns
+    for that hour.
+    """
+    traffic_level = np.minimum(100, traffic + event_timeline.T[None, :, :])
+    weather_score = np.where(np.asarray(weather_suitable_by_hour), 100 * 0.2, 0)[None, :, None]
+    business_score = traffic_level * 0.5 + static["competition_score"][None, None, :] + weather_score
+    return {
+        "traffic_level": traffic_level,
+        "business_score": business_score,
+        "recommendation_level": recommendation_levels(business_score),
+    }
+
+
+def select_rows(scores: Dict[str, np.ndarray], min_traffic: int = 0, sort: bool = True) -> np.ndarray:
+    """
+    Row indices passing the traffic filter.
+    With sort=True they are ordered by rounded business score (desc, stable).
+    """
+    keep = np.nonzero(scores["traffic_level"] >= min_traffic)[0]
+    if not sort:
+        return keep
+    order = np.argsort(-np.round(scores["business_score"][keep], 1), kind="stable")
+    return keep[order]
+
+
+def _score_fields(scores: Dict[str, np.ndarray], i: int) -> Dict:
+    recommendation, color = RECOMMENDATIONS[scores["recommendation_level"][i]]
+    return {
+        "business_score": round(float(scores["business_score"][i]), 1),
+        "recommendation": recommendation,
+        "color": color,
+        "breakdown": {
+            "traffic_contribution": round(float(scores["traffic_score"][i]), 1),
+            "competition_contribution": round(float(scores["competition_score"][i]), 1),
+            "weather_contribution": round(float(scores["weather_score"][i]), 1)
+        }
+    }
+
+
+def lookup_permits(static: Dict, rows: np.ndarray) -> List[Dict]:
+    """Permit status for each selected row, in row order (from the static columns)."""
+    permits = static["permits"]
+    return [permits[i] for i in rows]
+
+
+def build_hotspot_results(
+    batch: HotspotBatch,
+    scores: Dict[str, np.ndarray],
+    rows: np.ndarray,
+    permits: List[Dict],
+    weather_suitable: bool,
+    events: Union[EventIndex, List[Dict], None] = None,
+    data_available: Optional[Sequence[bool]] = None,
+) -> List[Dict]:
+    """Build the /api/hotspots-scored response dicts for the selected rows."""
+    events = events.events if isinstance(events, EventIndex) else events or []
+    _, pair_events, pair_dists = scores["event_pairs"]
+    pair_boost = scores["event_pair_boost"]
+    starts = scores["event_pair_starts"]
+    result = []
+    for i, permit_info in zip(rows, permits):
+        spot = batch.hotspots[i]
+        density_info = DENSITY_LABELS[scores["density_level"][i]]
+
+        spot_result = spot.copy()
+        spot_result["traffic_level"] = int(scores["traffic_level"][i])
+        spot_result["nearest_cafe_distance"] = round(float(scores["nearest_cafe_distance"][i]), 1)
+        spot_result["cafe_density"] = int(scores["cafe_density"][i])
+        spot_result["density_label"] = density_info["label"]
+        spot_result["density_color"] = density_info["color"]
+        spot_result["weather_suitable"] = weather_suitable
+        spot_result["data_available"] = bool(data_available[i]) if data_available is not None else False
+        spot_result.update(_score_fields(scores, i))
+
+        spot_result["permit_status"] = permit_info["status"]
+        spot_result["permit_label"] = permit_info["label"]
+        spot_result["permit_color"] = permit_info["color"]
+
+        # Events in range that have an effect at this hour
+        spot_result["nearby_events"] = [
+            {
+                "name": events[j]["name"],
+                "distance": int(dist),
+                "boost": boost
+            }
+            for j, dist, boost in zip(
+                pair_events[starts[i]:starts[i + 1]].tolist(),
+                pair_dists[starts[i]:starts[i + 1]].tolist(),
+                pair_boost[starts[i]:starts[i + 1]].tolist()
+            )
+            if boost > 0
+        ]
+        spot_result["event_boost"] = int(scores["event_boost"][i])
+        spot_result["original_traffic"] = int(scores["original_traffic"][i])
+
+        result.append(spot_result)
+    return result
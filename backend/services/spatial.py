@@ -0,0 +1,263 @@
+"""
+Grid-based spatial index for point lookups (cafes, events, hotspots).
+
+Points are projected to local equirectangular meters and bucketed into square
+cells. Queries only visit the cells that can reach the search radius and then
+use the exact Haversine distance, so results match a full linear scan.
+"""
+
+import math
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+EARTH_RADIUS = 6371000  # meters
+DEFAULT_CELL_SIZE = 250  # meters
+
+# Safety factor on projected distances; the local projection drifts by well
+# under 1% across a city, so 5% keeps pruning conservative.
+PROJECTION_PAD = 1.05
+
+# Nearest-neighbour ring search gives up after this many rings and falls back
+# to a brute-force scan for the (rare) points that are still unresolved.
+MAX_NEAREST_RINGS = 8
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Vectorized Haversine distance in meters (accepts scalars or arrays)."""
+    lat1_rad = np.radians(lat1)
+    lat2_rad = np.radians(lat2)
+    delta_lat = np.radians(np.subtract(lat2, lat1))
+    delta_lon = np.radians(np.subtract(lon2, lon1))
+
+    a = np.sin(delta_lat / 2) ** 2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(delta_lon / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    return EARTH_RADIUS * c
+
+
+def _expand_ranges(owners: np.ndarray, starts: np.ndarray, lengths: np.ndarray):
+    """
+    Flatten (owner, start, length) slices into parallel owner/index arrays.
+    """
+    total = int(lengths.sum())
+    if total == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    owner_rep = np.repeat(owners, lengths)
+    offsets = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return owner_rep, np.repeat(starts, lengths) + offsets
+
+
+class SpatialIndex:
+    """
+    Uniform grid over projected coordinates.
+
+    Build once per dataset (e.g. when a city's cafes are loaded) and reuse for
+    nearest-neighbour, radius-count and bounding-box queries.
+    """
+
+    def __init__(self, lats: Sequence[float], lons: Sequence[float], cell_size: float = DEFAULT_CELL_SIZE):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.cell_size = float(cell_size)
+        self.size = len(self.lats)
+        self.records: Optional[List[Dict]] = None
+
+        self.ref_lat = float(self.lats.mean()) if self.size else 0.0
+        self._x_scale = EARTH_RADIUS * math.cos(math.radians(self.ref_lat)) * math.pi / 180
+        self._y_scale = EARTH_RADIUS * math.pi / 180
+
+        if self.size == 0:
+            self._order = np.empty(0, dtype=np.int64)
+            self._keys = np.empty(0, dtype=np.int64)
+            self._starts = np.empty(0, dtype=np.int64)
+            self._ends = np.empty(0, dtype=np.int64)
+            self._cx_min = self._cy_min = 0
+            self._nx = self._ny = 1
+            return
+
+        cx, cy = self._cells(self.lats, self.lons)
+        self._cx_min, self._cy_min = int(cx.min()), int(cy.min())
+        self._nx = int(cx.max()) - self._cx_min + 1
+        self._ny = int(cy.max()) - self._cy_min + 1
+
+        keys = (cx - self._cx_min) * self._ny + (cy - self._cy_min)
+        self._order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[self._order]
+        self._keys, self._starts, counts = np.unique(sorted_keys, return_index=True, return_counts=True)
+        self._ends = self._starts + counts
+
+        # Store coordinates in cell order so candidate slices are contiguous
+        self._sorted_lats = self.lats[self._order]
+        self._sorted_lons = self.lons[self._order]
+
+    @classmethod
+    def from_records(cls, records: List[Dict], cell_size: float = DEFAULT_CELL_SIZE) -> "SpatialIndex":
+        """Build an index from dicts with 'lat'/'lon' keys, skipping error entries."""
+        valid = [r for r in records if not r.get("error") and r.get("lat") is not None and r.get("lon") is not None]
+        index = cls([r["lat"] for r in valid], [r["lon"] for r in valid], cell_size)
+        index.records = valid
+        return index
+
+    def _cells(self, lats: np.ndarray, lons: np.ndarray):
+        cx = np.floor(lons * self._x_scale / self.cell_size).astype(np.int64)
+        cy = np.floor(lats * self._y_scale / self.cell_size).astype(np.int64)
+        return cx, cy
+
+    def _lookup(self, owners: np.ndarray, cx: np.ndarray, cy: np.ndarray):
+        """Return flattened (owner, point position) pairs for the given cells."""
+        gx = cx - self._cx_min
+        gy = cy - self._cy_min
+        in_grid = (gx >= 0) & (gx < self._nx) & (gy >= 0) & (gy < self._ny)
+        owners, gx, gy = owners[in_grid], gx[in_grid], gy[in_grid]
+
+        keys = gx * self._ny + gy
+        pos = np.searchsorted(self._keys, keys)
+        pos = np.minimum(pos, len(self._keys) - 1)
+        found = self._keys[pos] == keys
+        pos, owners = pos[found], owners[found]
+
+        starts = self._starts[pos]
+        return _expand_ranges(owners, starts, self._ends[pos] - starts)
+
+    def _candidates(self, lats: np.ndarray, lons: np.ndarray, offsets: np.ndarray):
+        """Candidate pairs for every query point across a set of cell offsets."""
+        qcx, qcy = self._cells(lats, lons)
+        n = len(lats)
+        owners = np.tile(np.arange(n), len(offsets))
+        cx = np.repeat(offsets[:, 0], n) + np.tile(qcx, len(offsets))
+        cy = np.repeat(offsets[:, 1], n) + np.tile(qcy, len(offsets))
+        return self._lookup(owners, cx, cy)
+
+    @staticmethod
+    def _square_offsets(reach: int) -> np.ndarray:
+        r = np.arange(-reach, reach + 1)
+        dx, dy = np.meshgrid(r, r, indexing="ij")
+        return np.column_stack([dx.ravel(), dy.ravel()])
+
+    @staticmethod
+    def _ring_offsets(k: int) -> np.ndarray:
+        if k == 0:
+            return np.zeros((1, 2), dtype=np.int64)
+        square = SpatialIndex._square_offsets(k)
+        return square[np.abs(square).max(axis=1) == k]
+
+    def count_within_many(self, lats: Sequence[float], lons: Sequence[float], radius: float) -> np.ndarray:
+        """Number of indexed points within `radius` meters of each query point."""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        if self.size == 0 or len(lats) == 0:
+            return np.zeros(len(lats), dtype=np.int64)
+
+        reach = int(math.ceil(radius * PROJECTION_PAD / self.cell_size))
+        owners, idx = self._candidates(lats, lons, self._square_offsets(reach))
+        dist = haversine(lats[owners], lons[owners], self._sorted_lats[idx], self._sorted_lons[idx])
+        return np.bincount(owners[dist <= radius], minlength=len(lats))
+
+    def within_many(self, lats: Sequence[float], lons: Sequence[float], radius: float):
+        """
+        All (query, point, distance) matches within `radius` meters.
+        Point indices refer to the original input order.
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        if self.size == 0 or len(lats) == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0, dtype=np.float64)
+
+        reach = int(math.ceil(radius * PROJECTION_PAD / self.cell_size))
+        owners, idx = self._candidates(lats, lons, self._square_offsets(reach))
+        dist = haversine(lats[owners], lons[owners], self._sorted_lats[idx], self._sorted_lons[idx])
+        hit = dist <= radius
+        return owners[hit], self._order[idx[hit]], dist[hit]
+
+    def nearest_many(self, lats: Sequence[float], lons: Sequence[float]) -> np.ndarray:
+        """Distance in meters to the nearest indexed point (inf if the index is empty)."""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        best = np.full(len(lats), np.inf)
+        if self.size == 0 or len(lats) == 0:
+            return best
+
+        pending = np.arange(len(lats))
+        max_rings = min(MAX_NEAREST_RINGS, max(self._nx, self._ny))
+        for k in range(max_rings + 1):
+            owners, idx = self._candidates(lats[pending], lons[pending], self._ring_offsets(k))
+            if len(owners):
+                targets = pending[owners]
+                dist = haversine(lats[targets], lons[targets], self._sorted_lats[idx], self._sorted_lons[idx])
+                np.minimum.at(best, targets, dist)
+            # Anything not yet visited is at least k cells away
+            pending = pending[best[pending] * PROJECTION_PAD > k * self.cell_size]
+            if len(pending) == 0:
+                return best
+
+        # Brute force for points far outside the indexed area
+        for i in pending:
+            best[i] = haversine(lats[i], lons[i], self.lats, self.lons).min()
+        return best
+
+    def nearest(self, lat: float, lon: float) -> float:
+        return float(self.nearest_many([lat], [lon])[0])
+
+    def count_within(self, lat: float, lon: float, radius: float) -> int:
+        return int(self.count_within_many([lat], [lon], radius)[0])
+
+    def query_bbox(self, south: float, west: float, north: float, east: float) -> np.ndarray:
+        """Indices (in input order) of points inside a lat/lon bounding box."""
+        if self.size == 0:
+            return np.empty(0, dtype=np.int64)
+
+        cx0, cy0 = self._cells(np.array([south]), np.array([west]))
+        cx1, cy1 = self._cells(np.array([north]), np.array([east]))
+        xs = np.arange(max(cx0[0], self._cx_min), min(cx1[0], self._cx_min + self._nx - 1) + 1)
+        ys = np.arange(max(cy0[0], self._cy_min), min(cy1[0], self._cy_min + self._ny - 1) + 1)
+        if len(xs) == 0 or len(ys) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        gx, gy = np.meshgrid(xs, ys, indexing="ij")
+        _, idx = self._lookup(np.zeros(gx.size, dtype=np.int64), gx.ravel(), gy.ravel())
+        lat = self._sorted_lats[idx]
+        lon = self._sorted_lons[idx]
+        inside = (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
+        return np.sort(self._order[idx[inside]])
+
+
+# Web Mercator tile size in pixels (map pixel/tile math)
+TILE_SIZE = 256
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def mercator_pixels(lats, lons, zoom: int):
+    """Global Web Mercator pixel coordinates (x, y) at a zoom level."""
+    lats = np.clip(np.asarray(lats, dtype=np.float64), -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT)
+    lons = np.asarray(lons, dtype=np.float64)
+    world = TILE_SIZE * (1 << zoom)
+    x = (lons + 180.0) / 360.0 * world
+    sin_lat = np.sin(np.radians(lats))
+    y = (0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * world
+    return x, y
+
+
+def cluster_points(lats, lons, zoom: int, radius_px: float):
+    """
+    Grid clustering in screen space: points falling in the same
+    radius_px x radius_px pixel cell at this zoom form one cluster.
+
+    Returns (cluster_lats, cluster_lons, counts, labels) where the cluster
+    position is the mean of its points and labels maps each point to its cluster.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    if len(lats) == 0:
+        empty = np.empty(0, dtype=np.float64)
+        return empty, empty, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    x, y = mercator_pixels(lats, lons, zoom)
+    cells = np.stack([np.floor(x / radius_px), np.floor(y / radius_px)], axis=1).astype(np.int64)
+    _, labels, counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+    labels = labels.ravel()
+    cluster_lats = np.bincount(labels, weights=lats) / counts
+    cluster_lons = np.bincount(labels, weights=lons) / counts
+    return cluster_lats, cluster_lons, counts, labels
@@ -0,0 +1,153 @@
+"""
+Map tiles in Mapbox Vector Tile (MVT 2.1) format.
+
+Point layers (cafes, hotspots) are encoded into protobuf tiles with a small
+hand-rolled encoder, so any MVT-capable map client can render them without
+extra dependencies on the server.
+"""
+
+import math
+import struct
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .spatial import TILE_SIZE, mercator_pixels
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+TILE_EXTENT = 4096  # integer coordinate space per tile
+TILE_BUFFER = 64  # extent units around the tile so edge symbols aren't clipped
+TILE_CACHE_MAX_ENTRIES = 1024
+
+# Protobuf wire types
+_VARINT = 0
+_LENGTH_DELIMITED = 2
+_GEOM_POINT = 1
+_CMD_MOVE_TO = 1
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _key(field: int, wire_type: int) -> bytes:
+    return _varint((field << 3) | wire_type)
+
+
+def _uint_field(field: int, value: int) -> bytes:
+    return _key(field, _VARINT) + _varint(value)
+
+
+def _bytes_field(field: int, payload: bytes) -> bytes:
+    return _key(field, _LENGTH_DELIMITED) + _varint(len(payload)) + payload
+
+
+def _packed_field(field: int, values: Sequence[int]) -> bytes:
+    return _bytes_field(field, b"".join(_varint(v) for v in values))
+
+
+def _encode_value(value: Any) -> bytes:
+    """Encode an MVT Value message (bool, int, float or string)."""
+    if isinstance(value, bool):
+        return _uint_field(7, int(value))
+    if isinstance(value, (int, np.integer)):
+        return _uint_field(6, _zigzag(int(value)))
+    if isinstance(value, (float, np.floating)):
+        return _key(3, 1) + struct.pack("<d", float(value))  # double_value (fixed64)
+    return _bytes_field(1, str(value).encode("utf-8"))
+
+
+def _row_lat(z: int, row: float) -> float:
+    """Latitude of a (fractional) tile row edge."""
+    n = 1 << z
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+
+def tile_bounds(z: int, x: int, y: int, buffer: float = 0) -> Tuple[float, float, float, float]:
+    """
+    (south, west, north, east) of a Web Mercator (XYZ) tile, optionally
+    grown by `buffer` extent units on each side.
+    """
+    n = 1 << z
+    pad = buffer / TILE_EXTENT
+    south = _row_lat(z, min(n, y + 1 + pad))
+    north = _row_lat(z, max(0, y - pad))
+    west = (x - pad) / n * 360.0 - 180.0
+    east = (x + 1 + pad) / n * 360.0 - 180.0
+    return south, west, north, east
+
+
+class LayerBuilder:
+    """Accumulates point features for one MVT layer."""
+
+    def __init__(self, name: str, z: int, x: int, y: int):
+        self.name = name
+        self.z, self.x, self.y = z, x, y
+        self._features: List[bytes] = []
+        self._keys: Dict[str, int] = {}
+        self._values: Dict[Tuple[type, Any], int] = {}
+        self._encoded_values: List[bytes] = []
+
+    def _key_index(self, key: str) -> int:
+        if key not in self._keys:
+            self._keys[key] = len(self._keys)
+        return self._keys[key]
+
+    def _value_index(self, value: Any) -> int:
+        # Keyed on type too, so 1, 1.0 and True stay distinct values
+        lookup = (type(value), value)
+        if lookup not in self._values:
+            self._values[lookup] = len(self._encoded_values)
+            self._encoded_values.append(_encode_value(value))
+        return self._values[lookup]
+
+    def add_points(self, lats: np.ndarray, lons: np.ndarray, properties: Sequence[Dict], ids: Optional[Sequence[Optional[int]]] = None):
+        """Add one point feature per coordinate; None-valued properties are left out."""
+        px, py = mercator_pixels(lats, lons, self.z)
+        scale = TILE_EXTENT / TILE_SIZE
+        tx = np.round((px - self.x * TILE_SIZE) * scale).astype(np.int64).tolist()
+        ty = np.round((py - self.y * TILE_SIZE) * scale).astype(np.int64).tolist()
+
+        for i, (fx, fy, props) in enumerate(zip(tx, ty, properties)):
+            tags = []
+            for key, value in props.items():
+                if value is None:
+                    continue
+                tags.append(self._key_index(key))
+                tags.append(self._value_index(value))
+            feature = b""
+            if ids is not None and ids[i] is not None and ids[i] >= 0:
+                feature += _uint_field(1, int(ids[i]))
+            feature += _packed_field(2, tags)
+            feature += _uint_field(3, _GEOM_POINT)
+            feature += _packed_field(4, [(_CMD_MOVE_TO & 0x7) | (1 << 3), _zigzag(fx), _zigzag(fy)])
+            self._features.append(feature)
+
+    def encode(self) -> bytes:
+        layer = _uint_field(15, 2)  # MVT version
+        layer += _bytes_field(1, self.name.encode("utf-8"))
+        for feature in self._features:
+            layer += _bytes_field(2, feature)
+        for key in self._keys:
+            layer += _bytes_field(3, key.encode("utf-8"))
+        for value in self._encoded_values:
+            layer += _bytes_field(4, value)
+        layer += _uint_field(5, TILE_EXTENT)
+        return layer
+
+    def __len__(self):
+        return len(self._features)
+
+
+def encode_tile(layers: Sequence[LayerBuilder]) -> bytes:
+    """Serialize layers into a tile; empty layers are omitted."""
+    return b"".join(_bytes_field(3, layer.encode()) for layer in layers if len(layer))
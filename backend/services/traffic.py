@@ -0,0 +1,158 @@
+"""
+Precompiled foot-traffic models.
+
+Traffic curves are plain data (DEFAULT_TRAFFIC_MODEL, optionally overridden
+per city via a "traffic_model" entry in config.CITIES) and are compiled once
+into a (spot_type, weekday, hour) -> level lookup table.
+"""
+
+import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from ..config import CITIES
+
+# Curves are lists of [start_hour, end_hour, multiplier]; hours not covered
+# use "otherwise". Level = min(100, int(base * multiplier)).
+DEFAULT_TRAFFIC_MODEL = {
+    "base": {
+        "tourist": 75,
+        "transport": 80,
+        "shopping": 70,
+        "park": 60,
+        "neighborhood": 50,
+        "cultural": 55
+    },
+    "default_base": 50,
+    "curves": {
+        # Parks: High during day, very low at night
+        "park": {"hours": [[6, 10, 0.6], [10, 18, 1.1], [18, 21, 0.5]], "otherwise": 0.1},
+        # Shopping: High during business hours
+        "shopping": {"hours": [[9, 11, 0.7], [11, 17, 1.0], [17, 19, 0.8]], "otherwise": 0.2},
+        # Transport: Rush hours
+        "transport": {"hours": [[7, 10, 1.2], [10, 15, 0.8], [15, 19, 1.2], [19, 23, 0.6]], "otherwise": 0.3},
+        # Tourist: Steady day, good evening
+        "tourist": {"hours": [[9, 12, 0.8], [12, 18, 1.1], [18, 23, 0.9]], "otherwise": 0.2},
+        # Neighborhood: Morning coffee + Evening
+        "neighborhood": {"hours": [[7, 10, 1.0], [10, 16, 0.6], [16, 20, 0.9]], "otherwise": 0.4},
+    },
+    # General fallback for types without their own curve
+    "default_curve": {"hours": [[8, 18, 0.9], [18, 22, 0.6]], "otherwise": 0.2},
+    # Weekend boost for tourist/park areas
+    "weekend_boost": 1.3,
+    "weekend_types": ["tourist", "park", "shopping"]
+}
+
+# Fallback busyness for scraped places (see popular_times.estimate_busyness)
+DEFAULT_BUSYNESS_MODEL = {
+    "curve": {"hours": [[0, 7, 0.2], [7, 10, 0.5], [10, 14, 0.9], [14, 18, 1.0], [18, 22, 0.8], [22, 23, 0.3]], "otherwise": 0.2},
+    "weekend_boost": 1.2
+}
+
+DEFAULT_TYPE = "_default"
+
+
+def _curve_multipliers(curve: Dict) -> List[float]:
+    multipliers = [curve["otherwise"]] * 24
+    for start, end, multiplier in curve["hours"]:
+        for hour in range(start, end):
+            multipliers[hour] = multiplier
+    return multipliers
+
+
+class TrafficModel:
+    """A traffic spec compiled into a (type, weekday, hour) lookup table."""
+
+    def __init__(self, spec: Dict):
+        self.spec = spec
+        self.types = list(spec["curves"].keys()) + [t for t in spec["base"] if t not in spec["curves"]]
+        self.types.append(DEFAULT_TYPE)
+        self._type_codes = {t: i for i, t in enumerate(self.types)}
+
+        table = np.zeros((len(self.types), 7, 24), dtype=np.int64)
+        for code, spot_type in enumerate(self.types):
+            base = spec["base"].get(spot_type, spec["default_base"])
+            curve = spec["curves"].get(spot_type, spec["default_curve"])
+            multipliers = _curve_multipliers(curve)
+            for day in range(7):
+                for hour in range(24):
+                    multiplier = multipliers[hour]
+                    if day >= 5 and spot_type in spec["weekend_types"]:
+                        multiplier *= spec["weekend_boost"]
+                    table[code, day, hour] = min(100, int(base * multiplier))
+        self.table = table
+
+    def type_code(self, spot_type: str) -> int:
+        return self._type_codes.get(spot_type, self._type_codes[DEFAULT_TYPE])
+
+    def type_codes(self, spot_types: Sequence[str]) -> np.ndarray:
+        return np.array([self.type_code(t) for t in spot_types], dtype=np.int64)
+
+    def level(self, spot_type: str, weekday: int, hour: int) -> int:
+        return int(self.table[self.type_code(spot_type), weekday, hour])
+
+    def levels(self, type_codes: np.ndarray, weekday: int, hour: int) -> np.ndarray:
+        """Traffic levels for many spots (by type code) at one point in time."""
+        return self.table[type_codes, weekday, hour]
+
+
+def city_now(city_id: Optional[str] = None) -> datetime.datetime:
+    """Current time in the city's "timezone" (server local time if it has none)."""
+    timezone = CITIES.get(city_id, {}).get("timezone") if city_id else None
+    return datetime.datetime.now(ZoneInfo(timezone)) if timezone else datetime.datetime.now()
+
+
+def resolve_time(
+    simulated_hour: Optional[int] = None,
+    now: Optional[datetime.datetime] = None,
+    city_id: Optional[str] = None
+) -> Tuple[int, int]:
+    """
+    (weekday, hour) for a request in the city's local time, as event windows
+    and the hourly forecast are; simulated hours assume a weekday (Monday).
+    """
+    if simulated_hour is not None:
+        return 0, simulated_hour
+    now = now or city_now(city_id)
+    return now.weekday(), now.hour
+
+
+def _merged_spec(city_id: Optional[str]) -> Dict:
+    spec = dict(DEFAULT_TRAFFIC_MODEL)
+    overrides = CITIES.get(city_id, {}).get("traffic_model", {}) if city_id else {}
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(spec.get(key), dict):
+            spec[key] = {**spec[key], **value}
+        else:
+            spec[key] = value
+    return spec
+
+
+# Compiled once per city at first use; the default model at import
+_models: Dict[Optional[str], TrafficModel] = {None: TrafficModel(DEFAULT_TRAFFIC_MODEL)}
+
+def get_traffic_model(city_id: Optional[str] = None) -> TrafficModel:
+    """Traffic model for a city (its overrides applied on top of the defaults)."""
+    if city_id not in _models:
+        if CITIES.get(city_id, {}).get("traffic_model"):
+            _models[city_id] = TrafficModel(_merged_spec(city_id))
+        else:
+            _models[city_id] = _models[None]
+    return _models[city_id]
+
+
+def _busyness_table(spec: Dict) -> np.ndarray:
+    multipliers = _curve_multipliers(spec["curve"])
+    table = np.zeros((7, 24), dtype=np.float64)
+    for day in range(7):
+        for hour in range(24):
+            multiplier = multipliers[hour]
+            if day >= 5:
+                multiplier *= spec["weekend_boost"]
+            table[day, hour] = multiplier
+    return table
+
+# (weekday, hour) -> busyness multiplier
+BUSYNESS_MULTIPLIERS = _busyness_table(DEFAULT_BUSYNESS_MODEL)
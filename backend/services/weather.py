@@ -1,44 +1,132 @@
-import requests
-from typing import Dict
+import time
+from typing import Dict, List, Optional
+from ..config import CITIES, DEFAULT_CITY_ID
+from .cache import SingleFlight
+from .http import get_http_client
+from .metrics import record_cache
 
-# Copenhagen coordinates
-COPENHAGEN_LAT = 55.6761
-COPENHAGEN_LON = 12.5683
+OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+WEATHER_CACHE_TTL = 10 * 60  # seconds
+WEATHER_VARIABLES = "temperature_2m,wind_speed_10m,precipitation"
 
-def get_weather() -> Dict:
+# Shared weather table: {city_id: {"data": current, "hourly": forecast, "fetched_at": ts}}
+_weather_cache: Dict[str, Dict] = {}
+# One bulk refresh at a time; concurrent misses share it
+_refresh_flight = SingleFlight("weather")
+
+def _is_fresh(entry: Optional[Dict]) -> bool:
+    return bool(entry) and time.time() - entry["fetched_at"] < WEATHER_CACHE_TTL
+
+async def get_weather(city_id: str = DEFAULT_CITY_ID) -> Dict:
     """
-    Fetch current weather data for Copenhagen using Open-Meteo API.
-    Returns temperature, wind speed, and precipitation probability.
+    Get current weather for a city from the shared weather table.
+    On a miss, all cities are refreshed in a single Open-Meteo request
+    (see refresh_all_weather); concurrent misses share that request, and
+    callers with an expired entry get it while the refresh runs.
+    If a refresh fails, the last good result is returned instead.
     """
-    url = "https://api.open-meteo.com/v1/forecast"
+    if city_id not in CITIES:
+        return {"error": f"Invalid city_id: {city_id}"}
+
+    entry = _weather_cache.get(city_id)
+    if _is_fresh(entry):
+        record_cache("weather", "hit")
+        return entry["data"]
+
+    # A refresh is already running: serve the previous result meanwhile
+    if entry and _refresh_flight.in_flight("all"):
+        record_cache("weather", "stale")
+        return entry["data"]
+
+    error = await _refresh_flight.do("all", refresh_all_weather)
+    entry = _weather_cache.get(city_id)
+    record_cache("weather", "stale" if error and entry else "miss")
+    if entry:
+        return entry["data"]
+    return error or {"error": f"No weather data for {city_id}"}
+
+async def get_weather_at_hour(city_id: str, hour: int) -> Dict:
+    """
+    Forecast weather for a given hour (0-23, city local time) today.
+    Falls back to current conditions if no hourly forecast is stored.
+    """
+    current = await get_weather(city_id)
+    return _weather_at_hour(city_id, hour) or current
+
+async def get_hourly_suitability(city_id: str) -> List[bool]:
+    """Weather suitability for each hour (0-23) of today, from the stored forecast."""
+    # One lookup (and at most one refresh) for all 24 hours
+    current = await get_weather(city_id)
+    suitable = current.get("is_suitable", True)
+    return [(_weather_at_hour(city_id, hour) or {}).get("is_suitable", suitable) for hour in range(24)]
+
+def _weather_at_hour(city_id: str, hour: int) -> Optional[Dict]:
+    """Stored forecast for an hour of today, None if there is none."""
+    hourly = (_weather_cache.get(city_id) or {}).get("hourly")
+    if not hourly or hour >= len(hourly["time"]):
+        return None
+
+    temp = hourly["temperature_2m"][hour]
+    wind = hourly["wind_speed_10m"][hour]
+    precip = hourly["precipitation"][hour]
+    return {
+        "temperature": temp,
+        "wind_speed": wind,
+        "precipitation": precip,
+        "timestamp": hourly["time"][hour],
+        "is_suitable": assess_weather_suitability(temp or 0, wind or 0, precip or 0),
+        "forecast": True
+    }
+
+async def refresh_all_weather(include_hourly: bool = True) -> Optional[Dict]:
+    """
+    Refresh the weather table for every city in CITIES with one HTTP call.
+    Open-Meteo accepts comma-separated coordinates and returns one result
+    per location. Returns an error dict on failure, otherwise None.
+    """
+    city_ids = list(CITIES.keys())
     params = {
-        "latitude": COPENHAGEN_LAT,
-        "longitude": COPENHAGEN_LON,
-        "current": "temperature_2m,wind_speed_10m,precipitation",
-        "timezone": "Europe/Copenhagen"
+        "latitude": ",".join(str(CITIES[c]["coords"]["lat"]) for c in city_ids),
+        "longitude": ",".join(str(CITIES[c]["coords"]["lon"]) for c in city_ids),
+        "current": WEATHER_VARIABLES,
+        "timezone": "auto"
     }
-    
+    if include_hourly:
+        params["hourly"] = WEATHER_VARIABLES
+        params["forecast_days"] = 1
+
     try:
-        response = requests.get(url, params=params, timeout=10)
+        response = await get_http_client().get(OPEN_METEO_URL, params=params)
         response.raise_for_status()
-        data = response.json()
-        
-        current = data.get("current", {})
-        
-        return {
-            "temperature": current.get("temperature_2m"),
-            "wind_speed": current.get("wind_speed_10m"),
-            "precipitation": current.get("precipitation"),
-            "timestamp": current.get("time"),
-            "is_suitable": assess_weather_suitability(
-                current.get("temperature_2m", 0),
-                current.get("wind_speed_10m", 0),
-                current.get("precipitation", 0)
-            )
-        }
+        results = response.json()
+        # A single location comes back as an object rather than a list
+        if isinstance(results, dict):
+            results = [results]
     except Exception as e:
         return {"error": str(e)}
 
+    fetched_at = time.time()
+    for city_id, data in zip(city_ids, results):
+        _weather_cache[city_id] = {
+            "data": _parse_current(data.get("current", {})),
+            "hourly": data.get("hourly") if include_hourly else None,
+            "fetched_at": fetched_at
+        }
+    return None
+
+def _parse_current(current: Dict) -> Dict:
+    return {
+        "temperature": current.get("temperature_2m"),
+        "wind_speed": current.get("wind_speed_10m"),
+        "precipitation": current.get("precipitation"),
+        "timestamp": current.get("time"),
+        "is_suitable": assess_weather_suitability(
+            current.get("temperature_2m", 0),
+            current.get("wind_speed_10m", 0),
+            current.get("precipitation", 0)
+        )
+    }
+
 def assess_weather_suitability(temp: float, wind: float, precip: float) -> bool:
     """
     Assess if weather is suitable for coffee cart operation.
@@ -0,0 +1,234 @@
+"""
+Automatic activity zone discovery.
+
+Hotspots and cafes are binned onto a coarse grid over the city's bbox
+(hotspots weigh HOTSPOT_WEIGHT cafes) and the counts are smoothed. Local
+density peaks at least ZONE_PEAK_SPACING apart become zone centres, and every
+dense cell joins its nearest peak within ZONE_MAX_RADIUS. Each zone gets a
+centre (weighted centroid of its points), the convex hull of its cells as a
+polygon, and an equivalent circle radius.
+
+Results are kept per city, keyed on the cafe data version and the hotspot
+list, and persisted under the cache directory so a restart doesn't
+recluster. All steps are vectorized over the grid, so thousands of points
+cluster in milliseconds.
+"""
+
+import base64
+import hashlib
+import json
+import math
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ..config import CITIES
+from .heatmap import CityGrid, local_peaks
+from .spatial import EARTH_RADIUS
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache")
+CACHE_FILE_PREFIX = "zones_"
+
+ZONE_CELL_SIZE = 200  # meters
+ZONE_SMOOTHING = 1  # cells on each side of the density window (3x3 cells)
+HOTSPOT_WEIGHT = 5  # a hotspot counts as this many cafes
+ZONE_MIN_PEAK_DENSITY = 10  # smoothed weight needed for a zone centre
+ZONE_MIN_CELL_DENSITY = 3  # smoothed weight needed for a cell to join a zone
+ZONE_PEAK_SPACING = 800  # meters between zone centres
+ZONE_MAX_RADIUS = 1200  # meters from its centre a zone may extend
+ZONE_PARAMS = (ZONE_CELL_SIZE, ZONE_SMOOTHING, HOTSPOT_WEIGHT, ZONE_MIN_PEAK_DENSITY,
+               ZONE_MIN_CELL_DENSITY, ZONE_PEAK_SPACING, ZONE_MAX_RADIUS)
+
+
+def _window_sum(values: np.ndarray, radius: int) -> np.ndarray:
+    """Sum over a (2r+1) x (2r+1) window, computed separably."""
+    padded = np.pad(values, radius, mode="constant")
+    rows, cols = values.shape
+    by_row = np.sum([padded[:, i:i + cols] for i in range(2 * radius + 1)], axis=0)
+    return np.sum([by_row[i:i + rows, :] for i in range(2 * radius + 1)], axis=0)
+
+
+def _convex_hull(points: np.ndarray) -> np.ndarray:
+    """Convex hull (Andrew's monotone chain) of (x, y) points, counter-clockwise."""
+    points = np.unique(points, axis=0)
+    if len(points) < 3:
+        return points
+
+    def half(ordered):
+        hull = []
+        for p in ordered:
+            while len(hull) >= 2 and (
+                (hull[-1][0] - hull[-2][0]) * (p[1] - hull[-2][1])
+                - (hull[-1][1] - hull[-2][1]) * (p[0] - hull[-2][0])
+            ) <= 0:
+                hull.pop()
+            hull.append(p)
+        return hull
+
+    ordered = points.tolist()
+    lower, upper = half(ordered), half(reversed(ordered))
+    return np.array(lower[:-1] + upper[:-1])
+
+
+def discover_zones(
+    city_id: str,
+    hotspot_lats: np.ndarray,
+    hotspot_lons: np.ndarray,
+    hotspot_names: List[str],
+    cafe_lats: np.ndarray,
+    cafe_lons: np.ndarray,
+) -> Dict:
+    """
+    Cluster a city's hotspots and cafes into zones.
+
+    Returns {"zones": [...], "grid": grid geometry, "labels": zone per grid
+    cell (-1 outside every zone)}; see locate_zones.
+    """
+    grid = CityGrid(CITIES[city_id]["bbox"], ZONE_CELL_SIZE)
+    lats = np.concatenate([hotspot_lats, cafe_lats])
+    lons = np.concatenate([hotspot_lons, cafe_lons])
+    weights = np.concatenate([np.full(len(hotspot_lats), HOTSPOT_WEIGHT, dtype=np.float64), np.ones(len(cafe_lats))])
+
+    cells = grid.locate(lats, lons)
+    inside = cells >= 0
+    counts = np.bincount(cells[inside], weights=weights[inside], minlength=grid.rows * grid.cols)
+    density = _window_sum(counts.reshape(grid.shape), ZONE_SMOOTHING)
+    spacing = max(1, int(round(ZONE_PEAK_SPACING / grid.cell_size)))
+    peaks = local_peaks(density, spacing, ZONE_MIN_PEAK_DENSITY)
+
+    labels = np.full(grid.rows * grid.cols, -1, dtype=np.int64)
+    if peaks:
+        # Dense cells join the nearest peak in reach (local planar distances)
+        x_scale = grid.lon_step / grid.lat_step
+        dense = np.nonzero(density.ravel() >= ZONE_MIN_CELL_DENSITY)[0]
+        d_row = (dense // grid.cols)[:, None] - (np.array(peaks) // grid.cols)[None, :]
+        d_col = ((dense % grid.cols)[:, None] - (np.array(peaks) % grid.cols)[None, :]) * x_scale
+        dist = np.hypot(d_row, d_col) * grid.lat_step * EARTH_RADIUS * math.pi / 180
+        nearest = dist.argmin(axis=1)
+        in_reach = dist[np.arange(len(dense)), nearest] <= ZONE_MAX_RADIUS
+        labels[dense[in_reach]] = nearest[in_reach]
+
+    point_zone = np.where(inside, labels[np.maximum(cells, 0)], -1)
+    n_hotspots = len(hotspot_lats)
+    zones = []
+    for zone_id in range(len(peaks)):
+        zone_cells = np.nonzero(labels == zone_id)[0]
+        members = np.nonzero(point_zone == zone_id)[0]
+        member_weights = weights[members]
+        if len(members):
+            center = [float(np.average(lats[members], weights=member_weights)),
+                      float(np.average(lons[members], weights=member_weights))]
+        else:
+            center = [float(grid.lats[peaks[zone_id]]), float(grid.lons[peaks[zone_id]])]
+
+        # Hull over the corners of the zone's cells
+        rows, cols = zone_cells // grid.cols, zone_cells % grid.cols
+        corner_rows = np.concatenate([rows, rows, rows + 1, rows + 1])
+        corner_cols = np.concatenate([cols, cols + 1, cols, cols + 1])
+        hull = _convex_hull(np.column_stack([corner_cols, corner_rows]))
+        polygon = [
+            [round(grid.bbox["north"] - r * grid.lat_step, 6), round(grid.bbox["west"] + c * grid.lon_step, 6)]
+            for c, r in hull.tolist()
+        ]
+
+        hotspot_members = members[members < n_hotspots]
+        if len(hotspot_members):
+            # Named after its busiest-looking hotspot: the one in the densest cell
+            top = hotspot_members[np.argmax(density.ravel()[cells[hotspot_members]])]
+            name = f"{hotspot_names[top]} area"
+        else:
+            name = f"Zone {zone_id + 1}"
+
+        zones.append({
+            "name": name,
+            "center": [round(center[0], 6), round(center[1], 6)],
+            "radius": int(round(math.sqrt(len(zone_cells) / math.pi) * grid.cell_size)),
+            "polygon": polygon,
+            "hotspot_count": int(len(hotspot_members)),
+            "cafe_count": int(len(members) - len(hotspot_members))
+        })
+
+    return {"zones": zones, "grid": grid.describe(), "labels": labels}
+
+
+def locate_zones(zone_set: Dict, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Discovered zone of each point (-1 outside every zone)."""
+    geometry = zone_set["grid"]
+    grid = CityGrid({k: geometry[k] for k in ("south", "west", "north", "east")}, geometry["cell_size"])
+    cells = grid.locate(lats, lons)
+    return np.where(cells >= 0, zone_set["labels"][np.maximum(cells, 0)], -1)
+
+
+def _zone_key(cafes_version, hotspot_lats: np.ndarray, hotspot_lons: np.ndarray) -> str:
+    """What a discovery result depends on: cafe data, hotspot positions and parameters."""
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(np.ascontiguousarray(hotspot_lats, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(hotspot_lons, dtype=np.float64).tobytes())
+    digest.update(repr(ZONE_PARAMS).encode("ascii"))
+    return f"{cafes_version}:{digest.hexdigest()}"
+
+
+def _cache_path(city_id: str) -> str:
+    return os.path.join(CACHE_DIR, f"{CACHE_FILE_PREFIX}{city_id}.json")
+
+
+def _save_zone_set(city_id: str, zone_set: Dict):
+    path = _cache_path(city_id)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "key": zone_set["key"],
+                "zones": zone_set["zones"],
+                "grid": zone_set["grid"],
+                "labels": base64.b64encode(zone_set["labels"].astype(np.int16).tobytes()).decode("ascii")
+            }, f)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"Zone cache write error: {e}")
+
+
+def _load_zone_set(city_id: str) -> Optional[Dict]:
+    path = _cache_path(city_id)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+        data["labels"] = np.frombuffer(base64.b64decode(data["labels"]), dtype=np.int16).astype(np.int64)
+        return data
+    except Exception as e:
+        print(f"Zone cache read error: {e}")
+        return None
+
+
+# Discovered zones per city, keyed by city_id
+_zone_sets: Dict[str, Dict] = {}
+
+def get_discovered_zones(city_id: str, batch, cafe_index, cafes_version) -> Optional[Dict]:
+    """
+    Discovered zones for a city's hotspots (a HotspotBatch) and cafes (a
+    SpatialIndex). Reclustered when the cafe data or hotspots change; served
+    from memory, then from the persisted result, otherwise computed.
+    None for unknown cities, which have no bbox to cluster over.
+    """
+    if city_id not in CITIES:
+        return None
+
+    key = _zone_key(cafes_version, batch.lats, batch.lons)
+    zone_set = _zone_sets.get(city_id)
+    if zone_set is not None and zone_set["key"] == key:
+        return zone_set
+
+    zone_set = _load_zone_set(city_id)
+    if zone_set is None or zone_set["key"] != key:
+        zone_set = discover_zones(
+            city_id, batch.lats, batch.lons, [h["name"] for h in batch.hotspots], cafe_index.lats, cafe_index.lons
+        )
+        zone_set["key"] = key
+        print(f"Discovered {len(zone_set['zones'])} activity zones for {city_id}")
+        _save_zone_set(city_id, zone_set)
+    _zone_sets[city_id] = zone_set
+    return zone_set